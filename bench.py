@@ -0,0 +1,152 @@
+#!/usr/bin/python3
+
+# Headless benchmarks for the acquisition to display pipeline, run with SDL's
+# dummy video driver. Every result is one JSON object per line so runs on
+# different commits can be diffed or loaded into anything.
+#
+#   stage - the pieces of a frame timed in isolation on deterministic data
+#   loop  - pyscope.py itself fed by synth.source for a number of frames
+
+import os
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+
+import argparse
+import compositor
+import graph
+import json
+import numpy as np
+import pygame
+import pyramid
+import ring
+import subprocess
+import synth
+import sys
+import tempfile
+import textcache
+import time
+import trigger
+import widget
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+def timed(fn, repeat):
+    fn()
+    t = np.empty(repeat)
+    for i in range(repeat):
+        begin = time.perf_counter_ns()
+        fn()
+        t[i] = time.perf_counter_ns() - begin
+    t = t / 1e6
+    return {'mean_ms': t.mean(), 'p50_ms': np.percentile(t, 50), 'p99_ms': np.percentile(t, 99), 'max_ms': t.max()}
+
+def synthetic(count, channels, seed=0):
+    return synth.Generator(channels, seed=seed).block(count).astype(np.float32)
+
+def stages(channels, rate, repeat):
+    screen = pygame.display.set_mode((1024, 600))
+    scope = graph.Scope(1024, 470)
+    # what arrives between two frames at 30 fps
+    block = synthetic(max(1, int(rate / 30)), channels)
+    samples = synthetic(scope.columns(), channels)
+
+    data = ring.Ring(1 << 16, channels)
+    def ring_io():
+        data.write(block)
+        data.read()
+
+    envelope = pyramid.Pyramid(12, scope.columns(), channels)
+    trig = trigger.Trigger()
+    trig.set_mode(trig.NORMAL)
+    for i in range(0, 1 << 16, len(block)):
+        envelope.add(block)
+
+    btn_size = (155, 30)
+    zoom = widget.Setting('Zoom', None, '1', [f"{i+1}" for i in range(100)], (0, 0), 470, btn_size)
+    combo = widget.Combobox('NORMAL', ['NORMAL', 'HIRES', 'LOWPO'], None, widget.btn_pos(470, 0, 3, btn_size), btn_size)
+    comp = compositor.Compositor(screen)
+    comp.add(zoom)
+    comp.add(combo)
+    comp.draw_widgets()
+    comp.update()
+    def widgets():
+        zoom.setting_next() if zoom.index < 50 else zoom.setting_reset()
+        comp.draw_widgets()
+        comp.update()
+
+    def combo_track():
+        combo.press(combo.rect.center)
+        combo.track((combo.rect.centerx, combo.rect.centery + 30))
+        combo.depress((0, 0))
+        combo.draw(screen)
+
+    def scope_draw():
+        scope.set_step(1)
+        scope.draw(screen, samples)
+
+    def scope_envelope():
+        scope.set_step(1 / 64)
+        scope.draw_envelope(screen, *envelope.latest(64, scope.columns()))
+
+    hud = textcache.Hud(pygame.font.Font(None, 30))
+    def hud_draw():
+        hud.draw(screen, (scope.x0, 0), f"batch: {len(block)} lat: {1.5:4.1f}/{12.25:4.1f}ms skip: 0", (157, 157, 157))
+
+    def display():
+        pygame.display.update(scope.rect())
+
+    results = []
+    for name, fn in [
+            ('ring', ring_io),
+            ('pyramid', lambda: envelope.add(block)),
+            ('trigger', lambda: trig.scan(block, 0)),
+            ('scope.draw', scope_draw),
+            ('scope.draw_envelope', scope_envelope),
+            ('widgets', widgets),
+            ('combobox', combo_track),
+            ('hud', hud_draw),
+            ('display.update', display),
+            ('display.flip', pygame.display.flip),
+            ]:
+        results.append(dict(bench='stage', stage=name, rate=rate, channels=channels, block=len(block), **timed(fn, repeat)))
+    data.close()
+    return results
+
+def loop(channels, rate, frames, fps):
+    with tempfile.TemporaryDirectory() as tmp:
+        stats = os.path.join(tmp, 'stats.json')
+        env = dict(os.environ, SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER='dummy')
+        subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyscope.py'),
+            '--synth', f"{rate}", '--channels', f"{channels}", '--frames', f"{frames}", '--fps', f"{fps}",
+            '--stats', stats], env=env, capture_output=True, check=True)
+        with open(stats) as f:
+            return dict(bench='loop', rate=rate, channels=channels, **json.load(f))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rates', default='1,100,1620,10000,100000', help='comma separated sample rates in Hz')
+    parser.add_argument('--channels', default='3', help='comma separated channel counts')
+    parser.add_argument('--repeat', type=int, default=200, help='iterations per stage')
+    parser.add_argument('--frames', type=int, default=150, help='frames per main loop run')
+    parser.add_argument('--fps', type=float, default=30, help='target frame rate of the main loop runs')
+    parser.add_argument('--no-loop', action='store_true', help='only time the stages')
+    parser.add_argument('-o', '--output', help='append results here instead of stdout')
+    args = parser.parse_args()
+
+    pygame.display.init()
+    pygame.font.init()
+
+    out = open(args.output, 'a') if args.output else sys.stdout
+    rev = commit()
+    for channels in [int(c) for c in args.channels.split(',')]:
+        for rate in [float(r) for r in args.rates.split(',')]:
+            results = stages(channels, rate, args.repeat)
+            if not args.no_loop:
+                results.append(loop(channels, rate, args.frames, args.fps))
+            for r in results:
+                out.write(json.dumps(dict(commit=rev, **r)) + '\n')
+            out.flush()
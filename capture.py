@@ -0,0 +1,168 @@
+import mmap
+import numpy as np
+import queue
+import source
+import struct
+import threading
+import time
+
+# Capture file layout, all little endian:
+#   header                      HEADER
+#   records, one per block      RECORD followed by n * channels float32
+#   record offsets              int64 each, only there if the recording was
+#   trailer                     TRAILER     closed properly, otherwise the
+#                                           records are walked on open
+# Every record carries the stream index of its first sample, the monotonic
+# acquisition time of its last sample, the rate in Hz and the range/mode
+# indices in effect, so settings changes during a recording are preserved.
+
+MAGIC = b'PYSC'
+INDEX_MAGIC = b'PIDX'
+# 1 had the rate as an index into lsm303.RATE_HZ
+VERSION = 2
+
+HEADER = struct.Struct('<4sHHfBBxx')
+RECORD = struct.Struct('<qIfBBxxq')
+TRAILER = struct.Struct('<qq4s4x')
+
+class Recorder (object):
+    # Appends blocks to a capture file from a writer thread. The queue in
+    # between is bounded and put() never blocks, if the disk can't keep up
+    # blocks get dropped instead of holding up acquisition, put() says so.
+
+    def __init__(self, path, channels, rate, rnge, mode, depth=1024):
+        self.path = path
+        self.f = open(path, 'wb')
+        self.f.write(HEADER.pack(MAGIC, VERSION, channels, rate, rnge, mode))
+        self.pos = HEADER.size
+        self.offsets = []
+        self.queue = queue.Queue(depth)
+        self.closing = threading.Event()
+        # not a daemon, the trailer gets written even if the process is on its way out
+        self.thread = threading.Thread(target=self._run)
+        self.thread.start()
+
+    def put(self, block, start, t, rate, rnge, mode):
+        try:
+            self.queue.put_nowait((np.array(block, '<f4'), start, t, rate, rnge, mode))
+        except queue.Full:
+            return False
+        return True
+
+    def close(self):
+        # returns right away, even with the queue full, the writer finishes
+        # what's queued in the background
+        self.closing.set()
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=.1)
+            except queue.Empty:
+                if self.closing.is_set():
+                    break
+                continue
+            block, start, t, rate, rnge, mode = item
+            self.offsets.append(self.pos)
+            self.f.write(RECORD.pack(start, len(block), rate, rnge, mode, t))
+            self.f.write(block.tobytes())
+            self.pos += RECORD.size + block.nbytes
+        self.f.write(np.array(self.offsets, '<i8').tobytes())
+        self.f.write(TRAILER.pack(self.pos, len(self.offsets), INDEX_MAGIC))
+        self.f.close()
+
+def record(rec, path, channels, settings):
+    # the sources' 'r' command, a path starts a new recording, None stops
+    # the current one
+    if rec:
+        rec.close()
+    if path:
+        try:
+            return Recorder(path, channels, *settings)
+        except OSError as e:
+            print(f"Can't record: {e}")
+    return None
+
+class Capture (object):
+
+    def __init__(self, path):
+        self.f = open(path, 'rb')
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.channels, self.rate, self.rnge, self.mode = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a capture file")
+        self.offsets = self._index()
+
+    def _index(self):
+        size = len(self.mm)
+        if size >= HEADER.size + TRAILER.size:
+            pos, count, magic = TRAILER.unpack_from(self.mm, size - TRAILER.size)
+            if magic == INDEX_MAGIC:
+                return np.frombuffer(self.mm, '<i8', count, pos).copy()
+        # no trailer, the recording wasn't closed properly
+        offsets = []
+        pos = HEADER.size
+        while pos + RECORD.size <= size:
+            n = RECORD.unpack_from(self.mm, pos)[1]
+            end = pos + RECORD.size + n * self.channels * 4
+            if end > size:
+                break
+            offsets.append(pos)
+            pos = end
+        return np.array(offsets, np.int64)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def block(self, i):
+        # (samples, start, t, rate, rnge, mode), samples is a view into the file
+        pos = int(self.offsets[i])
+        start, n, rate, rnge, mode, t = RECORD.unpack_from(self.mm, pos)
+        samples = np.ndarray((n, self.channels), '<f4', self.mm, pos + RECORD.size)
+        return (samples, start, t, rate, rnge, mode)
+
+    def close(self):
+        try:
+            self.mm.close()
+        except BufferError:
+            pass
+        self.f.close()
+
+def playback(data, ctrl, run, path, speed=1):
+    # Feeds a capture file into the ring like lsm303.Accel does, paced by the
+    # recorded timestamps and sped up by speed, speed <= 0 goes flat out.
+    cap = Capture(path)
+    t0 = None
+    for i in range(len(cap)):
+        if not run.value:
+            break
+        samples, start, t, rate, rnge, mode = cap.block(i)
+        if t0 is None:
+            t0 = t
+            wall0 = time.monotonic_ns()
+        if speed > 0:
+            delay = wall0 + (t - t0) / speed - time.monotonic_ns()
+            if delay > 0:
+                time.sleep(delay / 1e9)
+        data.write(samples, time.monotonic_ns())
+        # settings can't be changed on a recording and it can't be recorded
+        # again, REC goes right back off
+        for cmd, val in ctrl.get():
+            if cmd == 'r':
+                ctrl.ack('r', 0)
+    cap.close()
+
+class Playback (source.Source):
+
+    def __init__(self, path, speed=1):
+        self.path = path
+        self.speed = speed
+        cap = Capture(path)
+        self.channels = cap.channels
+        # as recorded, played faster or slower it's that much more or less,
+        # flat out there's no telling
+        self.rate = cap.rate * speed if speed > 0 else None
+        cap.close()
+
+    def run(self, data, ctrl, run):
+        playback(data, ctrl, run, self.path, self.speed)
@@ -0,0 +1,59 @@
+import pygame
+
+class Compositor (object):
+    # Keeps track of the damaged parts of the screen so a frame only redraws
+    # the widgets that changed and only pushes those rects to the display,
+    # instead of fill + redraw everything + flip.
+
+    def __init__(self, surface, bg=(0, 0, 0)):
+        self.surface = surface
+        self.bg = bg
+        self.widgets = []
+        self.statics = []
+        self.rects = []
+        self.full = True
+
+    def add(self, widget):
+        self.widgets.append(widget)
+        self.full = True
+
+    def add_static(self, surface, pos):
+        # only drawn on a full redraw
+        self.statics.append((surface, pos))
+        self.full = True
+
+    def invalidate(self):
+        self.full = True
+
+    def damage(self, rect):
+        self.rects.append(pygame.Rect(rect))
+
+    def draw_widgets(self, focus=None):
+        if self.full:
+            self.surface.fill(self.bg)
+            for surface, pos in self.statics:
+                self.surface.blit(surface, pos)
+            redraw = list(self.widgets)
+        else:
+            clear = [w.area() for w in self.widgets if w.is_dirty()]
+            if not clear:
+                return
+            for rect in clear:
+                self.surface.fill(self.bg, rect)
+            self.rects.extend(clear)
+            # anything overlapping a cleared area has to be redrawn as well,
+            # e.g. the buttons underneath a combobox that just closed
+            redraw = [w for w in self.widgets if w.area().collidelist(clear) != -1]
+        if focus in redraw:
+            redraw.remove(focus)
+            redraw.append(focus)
+        for w in redraw:
+            self.rects.append(w.draw(self.surface))
+
+    def update(self):
+        if self.full:
+            pygame.display.flip()
+            self.full = False
+        elif self.rects:
+            pygame.display.update(self.rects)
+        self.rects = []
@@ -0,0 +1,127 @@
+import multiprocessing as mp
+import numpy as np
+import os
+import queue
+from multiprocessing import shared_memory
+
+class Control (object):
+    # Commands from the UI to the acquisition process and back.
+    #
+    # The (cmd, value) tuples still travel through a queue, but how many
+    # were sent is counted in shared memory and the source only goes to the
+    # queue while it has taken out fewer than that - per block that's one
+    # integer compare instead of a ctrl.empty() system call.
+    # The source acknowledges what actually went into effect in a slot per
+    # command, with a generation counter so the UI only has to look when
+    # something changed. Slots nobody acknowledged yet hold -1.
+
+    SENT = 0
+    ACKED = 1
+    HEADER = 2
+
+    def __init__(self, cmds, name=None, q=None):
+        self.cmds = list(cmds)
+        size = (self.HEADER + len(self.cmds)) * np.dtype(np.int64).itemsize
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.hdr = np.ndarray((self.HEADER,), np.int64, self.shm.buf, 0)
+        self.acks = np.ndarray((len(self.cmds),), np.int64, self.shm.buf, self.hdr.nbytes)
+        if self.owner:
+            self.hdr[:] = 0
+            self.acks[:] = -1
+        self.queue = mp.Queue() if q is None else q
+        # on the source side, commands taken out of the queue
+        self.taken = 0
+        # on the UI side, the last acknowledgement generation looked at
+        self.acked_seen = 0
+
+    def __reduce__(self):
+        # attaches to the same block in another process
+        return (self.__class__, (self.cmds, self.shm.name, self.queue))
+
+    def close(self):
+        if self.owner:
+            self.shm.unlink()
+        del self.hdr
+        del self.acks
+        try:
+            self.shm.close()
+        except BufferError:
+            pass
+
+    # UI side
+
+    def put(self, cmd, value):
+        self.queue.put((cmd, value))
+        # only ever written from here, no lock needed
+        self.hdr[self.SENT] += 1
+
+    def acked(self):
+        # {cmd: value} of everything acknowledged so far, None if nothing
+        # changed since the last call
+        gen = int(self.hdr[self.ACKED])
+        if gen == self.acked_seen:
+            return None
+        self.acked_seen = gen
+        return {cmd: int(v) for cmd, v in zip(self.cmds, self.acks) if v >= 0}
+
+    # source side
+
+    def get(self):
+        # the commands sent since the last call, usually none at all
+        if self.hdr[self.SENT] == self.taken:
+            return ()
+        out = []
+        try:
+            while True:
+                out.append(self.queue.get_nowait())
+        except queue.Empty:
+            # counted but still on its way through the pipe, next time
+            pass
+        self.taken += len(out)
+        return out
+
+    def ack(self, cmd, value):
+        if cmd in self.cmds:
+            self.acks[self.cmds.index(cmd)] = value
+            self.hdr[self.ACKED] += 1
+
+class Group (object):
+    # The Controls of several sources behind one set of widgets. Commands go
+    # to every source that knows them, a recording to a file per source.
+    # What the first source acknowledged wins.
+
+    def __init__(self, ctrls):
+        self.ctrls = ctrls
+        self.acks = [{} for c in ctrls]
+
+    def close(self):
+        for c in self.ctrls:
+            c.close()
+
+    def put(self, cmd, value):
+        for i, c in enumerate(self.ctrls):
+            if cmd not in c.cmds:
+                continue
+            if cmd == 'r' and value and i > 0:
+                root, ext = os.path.splitext(value)
+                c.put(cmd, f"{root}-{i}{ext}")
+            else:
+                c.put(cmd, value)
+
+    def acked(self):
+        changed = False
+        for i, c in enumerate(self.ctrls):
+            acks = c.acked()
+            if acks is not None:
+                self.acks[i] = acks
+                changed = True
+        if not changed:
+            return None
+        out = {}
+        for acks in reversed(self.acks):
+            out.update(acks)
+        return out
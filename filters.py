@@ -0,0 +1,217 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Block wise filters for (N, channels) blocks of samples. Every filter keeps
+# what it needs of the previous block, so a stream cut into blocks of any
+# size comes out the same as filtered in one go. Before the first block the
+# signal is taken to have sat at its first value forever, that way picking
+# another filter doesn't kick the trace.
+# Frequencies are fractions of the sample rate.
+
+def lowpass(taps, cutoff):
+    # windowed sinc
+    n = np.arange(taps) - (taps - 1) / 2
+    h = np.sinc(2 * cutoff * n) * np.hamming(taps)
+    return h / h.sum()
+
+def biquad_lowpass(f, q=.7071):
+    # (b, a) from the audio EQ cookbook, normalized to a[0] = 1
+    w = 2 * np.pi * f
+    c = np.cos(w)
+    alpha = np.sin(w) / (2 * q)
+    b = np.array([(1 - c) / 2, 1 - c, (1 - c) / 2])
+    a = np.array([1 + alpha, -2 * c, 1 - alpha])
+    return b / a[0], a / a[0]
+
+def biquad_highpass(f, q=.7071):
+    w = 2 * np.pi * f
+    c = np.cos(w)
+    alpha = np.sin(w) / (2 * q)
+    b = np.array([(1 + c) / 2, -(1 + c), (1 + c) / 2])
+    a = np.array([1 + alpha, -2 * c, 1 - alpha])
+    return b / a[0], a / a[0]
+
+class FIR (object):
+
+    def __init__(self, taps):
+        self.taps = np.asarray(taps, np.float64)
+        # the last len(taps) - 1 samples
+        self.state = None
+
+    def process(self, block):
+        x = np.asarray(block, np.float64)
+        if self.state is None:
+            self.state = np.repeat(x[:1], len(self.taps) - 1, axis=0)
+        x = np.concatenate((self.state, x))
+        self.state = x[len(x) - len(self.taps) + 1:]
+        return sliding_window_view(x, len(self.taps), axis=0) @ self.taps[::-1]
+
+class MovingAverage (object):
+    # the same as an FIR of n equal taps, in O(block) whatever n is
+
+    def __init__(self, n):
+        self.n = n
+        self.state = None
+
+    def process(self, block):
+        x = np.asarray(block, np.float64)
+        if self.state is None:
+            self.state = np.repeat(x[:1], self.n, axis=0)
+        x = np.concatenate((self.state, x))
+        self.state = x[len(x) - self.n:]
+        s = np.cumsum(x, axis=0)
+        return (s[self.n:] - s[:-self.n]) / self.n
+
+class Biquad (object):
+    # Direct form II transposed, z1 and z2 per channel carried over. Instead
+    # of going sample by sample, chunk samples at a time are one product
+    # with the impulse response as a lower triangular matrix plus the
+    # response to the state the chunk started in, which is exact.
+
+    def __init__(self, b, a, chunk=256):
+        self.b = np.asarray(b, np.float64)
+        self.a = np.asarray(a, np.float64)
+        self.chunk = chunk
+        impulse = self._simulate(np.eye(1, chunk)[0], (0, 0))
+        i = np.arange(chunk)
+        self.h = np.where(i[:, None] >= i, impulse[i[:, None] - i], 0)
+        zero = np.zeros(chunk)
+        self.g = np.stack((self._simulate(zero, (1, 0)), self._simulate(zero, (0, 1))), 1)
+        self.state = None
+
+    def _simulate(self, x, z):
+        # the textbook loop, only used to set up the matrices
+        b0, b1, b2 = self.b
+        a1, a2 = self.a[1:]
+        z1, z2 = z
+        y = np.empty(len(x))
+        for n, v in enumerate(x):
+            y[n] = b0 * v + z1
+            z1, z2 = b1 * v - a1 * y[n] + z2, b2 * v - a2 * y[n]
+        return y
+
+    def process(self, block):
+        x = np.asarray(block, np.float64)
+        b0, b1, b2 = self.b
+        a1, a2 = self.a[1:]
+        if self.state is None:
+            x0 = x[:1] if len(x) else np.zeros((1, x.shape[1]))
+            y0 = x0 * self.b.sum() / self.a.sum()
+            self.state = np.concatenate((y0 - b0 * x0, b2 * x0 - a2 * y0))
+        out = np.empty_like(x)
+        for i in range(0, len(x), self.chunk):
+            xc = x[i:i + self.chunk]
+            n = len(xc)
+            y = self.h[:n, :n] @ xc + self.g[:n] @ self.state
+            z2 = b2 * xc[-2] - a2 * y[-2] if n > 1 else self.state[1]
+            self.state = np.stack((b1 * xc[-1] - a1 * y[-1] + z2, b2 * xc[-1] - a2 * y[-1]))
+            out[i:i + n] = y
+        return out
+
+class Decimate (object):
+    # low pass to keep what's left below the new Nyquist, then every
+    # factor-th sample, counting on from the last block
+
+    def __init__(self, factor, taps=None):
+        self.factor = factor
+        self.fir = FIR(lowpass(taps or 8 * factor + 1, .4 / factor))
+        self.phase = 0
+        # input samples from the one the last output stands for to the end
+        # of the last block
+        self.behind = 0
+
+    def process(self, block):
+        y = self.fir.process(block)
+        out = y[self.phase::self.factor]
+        if len(out):
+            # the rest of the block plus the filter's delay
+            last = self.phase + (len(out) - 1) * self.factor
+            self.behind = len(y) - 1 - last + (len(self.fir.taps) - 1) // 2
+        self.phase = (self.phase - len(y)) % self.factor
+        return out
+
+class Chain (object):
+
+    def __init__(self, filters):
+        self.filters = filters
+
+    def process(self, block):
+        for f in self.filters:
+            block = f.process(block)
+        return block
+
+# what the widgets offer, none of them change the rate
+PRESETS = [
+    ('RAW', lambda: []),
+    ('AVG 4', lambda: [MovingAverage(4)]),
+    ('AVG 16', lambda: [MovingAverage(16)]),
+    ('FIR LP', lambda: [FIR(lowpass(63, .05))]),
+    ('IIR LP', lambda: [Biquad(*biquad_lowpass(.02)), Biquad(*biquad_lowpass(.02))]),
+    ('IIR HP', lambda: [Biquad(*biquad_highpass(.005))]),
+    ]
+
+def names():
+    return [name for name, make in PRESETS]
+
+def chain(index):
+    return Chain(PRESETS[index][1]())
+
+class Filtered (object):
+    # Stands in for the ring a source or the merger writes to and filters
+    # every block on its way in, in the writer's process, so the scope only
+    # ever sees filtered data. The chain of every channel is picked with the
+    # commands 'F0', 'F1', ... of ctrl, as an index into PRESETS. Decimation
+    # goes for all channels, the ring gets a lower rate. Its stamps are moved
+    # back to the samples that come out, going by the period between the
+    # stamps of what goes in.
+
+    def __init__(self, ring, ctrl, decimate=1):
+        self.ring = ring
+        self.ctrl = ctrl
+        self.factor = decimate
+        self.chains = [chain(0) for c in range(ring.channels)]
+        self.decimate = Decimate(decimate) if decimate > 1 else None
+        # samples written, before decimation
+        self.count = 0
+        self.last = None
+        self.period = None
+
+    def __reduce__(self):
+        # starts over with fresh filters in the writer's process
+        return (self.__class__, (self.ring, self.ctrl, self.factor))
+
+    def __getattr__(self, name):
+        # anything else is the ring's
+        return getattr(self.ring, name)
+
+    def written(self):
+        # the writer's count, what it recorded goes by the samples it wrote
+        return self.count
+
+    def _stamped(self, stamp):
+        # ns per input sample, smoothed over the jitter of the stamps
+        if self.last is not None and self.count > self.last[0]:
+            period = (stamp - self.last[1]) / (self.count - self.last[0])
+            self.period = period if self.period is None else self.period + (period - self.period) * .1
+        self.last = (self.count, stamp)
+
+    def write(self, block, stamp=None):
+        for cmd, index in self.ctrl.get():
+            self.chains[int(cmd[1:])] = chain(index)
+            self.ctrl.ack(cmd, index)
+        x = np.asarray(block).reshape(-1, self.ring.channels)
+        self.count += len(x)
+        if stamp is not None:
+            self._stamped(stamp)
+        if self.decimate is None and not any(c.filters for c in self.chains):
+            return self.ring.write(block, stamp)
+        x = x.astype(np.float64)
+        y = np.empty_like(x)
+        for c, ch in enumerate(self.chains):
+            y[:, c:c + 1] = ch.process(x[:, c:c + 1])
+        if self.decimate:
+            y = self.decimate.process(y)
+            if stamp is not None and self.period:
+                stamp = int(stamp - self.decimate.behind * self.period)
+        if len(y):
+            self.ring.write(y, stamp)
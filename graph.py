@@ -1,14 +1,25 @@
+import numpy as np
 import pygame
+import textcache
 
 class Scope (object):
+    colors = [(200, 200, 0), (0, 200, 0), (0, 200, 200)]
+    font = None
 
     def __init__(self, xmax, ymax):
         self.size = (xmax, ymax)
-        self.bg = pygame.Surface(self.size)
-        self.setup_bg(self.bg)
+        self.grid = pygame.Surface(self.size)
+        self.setup_bg(self.grid)
+        self.grid = textcache.display_format(self.grid)
         pygame.display.update()
         self.boundbox = pygame.Rect(0, 0, self.size[0], self.size[1])
-        self.step = 1
+        # the grid with the scale of each zoom level that was on screen
+        # lately, only a few of them so they don't add up to much memory
+        self.layers = textcache.Cache(8)
+        self.set_step(1)
+        self.pts = None
+        self.gain = None
+        self.bin_key = None
 
     def setup_bg(self, bg):
         xline_count = 10
@@ -40,6 +51,7 @@ class Scope (object):
         self.ylim = (ymin, ymax)
         self.x0 = x0
         self.y0 = y0
+        self.xdiv = xline
 
         bg.fill((0, 0, 0))        
 
@@ -70,19 +82,325 @@ class Scope (object):
         return self.boundbox
 
     def set_step(self, step):
+        # pixels per sample, below 1 a pixel column covers 1 / step samples
         self.step = step
+        self.pts = None
+        self.bg = self.layers.get(('grid', step), self._make_bg)
+
+    def _make_bg(self):
+        bg = self.grid.copy()
+        if pygame.font.get_init():
+            if self.font is None:
+                self.__class__.font = pygame.font.Font(None, 20)
+            text = self.font.render(f"{self.xdiv / self.step:.3g} S/div", True, (128, 128, 128))
+            bg.blit(text, (self.xlim[1] - text.get_width() - 4, self.ylim[1] - text.get_height() - 2))
+        return bg
+
+    def set_channels(self, count, colors=None, gain=None, offset=None):
+        # Per channel trace color, gain and offset, the offset in % of the
+        # screen height like the samples. Past the three default colors the
+        # channels get a palette and lanes of their own stacked top to bottom.
+        if colors is None:
+            if count <= len(self.colors):
+                colors = self.colors[:count]
+            else:
+                colors = []
+                for i in range(count):
+                    c = pygame.Color(0)
+                    c.hsva = (360 * i / count, 80, 90, 100)
+                    colors.append(tuple(c)[:3])
+        if gain is None:
+            gain = 1 if count <= len(self.colors) else 1 / count
+        if offset is None:
+            offset = 0 if count <= len(self.colors) else 50 - 100 * (np.arange(count) + .5) / count
+        self.channel_colors = list(colors)
+        scale = (self.ylim[1] - self.ylim[0]) * 0.01
+        # pixels per unit and offset in pixels, as columns to go with [channel, sample]
+        self.gain = np.broadcast_to(np.asarray(gain, np.float32) * scale, (count,)).reshape(-1, 1).copy()
+        self.offset = np.broadcast_to(np.asarray(offset, np.float32) * scale, (count,)).reshape(-1, 1).copy()
+
+    def decimation(self):
+        return round(1 / self.step) if self.step < 1 else 1
+
+    def columns(self):
+        return self.xlim[1] - self.xlim[0]
+
+    def span(self):
+        # samples across the screen at the current step
+        return (self.columns() + self.step - 1) // self.step
+
+    def _points(self, count, channels, step=None):
+        # x never changes for a given step, only y is filled in per frame
+        if step is None:
+            step = self.step
+        if self.gain is None or len(self.gain) != channels:
+            self.set_channels(channels)
+        if self.pts is None or self.pts.shape[:2] != (channels, count) or self.pts_step != step:
+            self.pts = np.empty((channels, count, 2), np.int32)
+            self.pts_step = step
+            if step < 1:
+                # envelope, two points per column
+                self.pts[:, :, 0] = self.xlim[0] + np.arange(count) // 2
+            else:
+                self.pts[:, :, 0] = self.xlim[0] + np.arange(count) * step
+            self.fy = np.empty((channels, count), np.float32)
+        return self.pts
+
+    def _polylines(self, surface, n, colors):
+        # pygame parses python ints a lot faster than numpy scalars. Off
+        # scale samples stay on the scope, what's around it isn't redrawn
+        # every frame to clear them.
+        clip = surface.get_clip()
+        surface.set_clip(self.rect())
+        for color, p in zip(colors, self.pts[:, :n].tolist()):
+            pygame.draw.lines(surface, color, False, p)
+        surface.set_clip(clip)
+
+    def _lines(self, surface, n):
+        # applies gain and offset to the first n values in fy, turns them
+        # into pixels and draws them, every step is one operation over all
+        # the channels
+        fy = self.fy[:, :n]
+        np.multiply(fy, self.gain, out=fy)
+        np.add(fy, self.offset, out=fy)
+        y = self.pts[:, :n, 1]
+        np.copyto(y, fy, casting='unsafe')
+        np.subtract(self.y0, y, out=y)
+        self._polylines(surface, n, self.channel_colors)
+
+    def clear(self, surface):
+        return surface.blit(self.bg, self.rect())
+
+    def draw_trigger(self, surface, position, level, channel=0, color=(255, 0, 0)):
+        # markers for the trigger point on the top and the level on the left
+        x = self.xlim[0] + int(position * self.columns())
+        y = self.y0 - int((self.ylim[1] - self.ylim[0]) * 0.01 * level)
+        if self.gain is not None and channel < len(self.gain):
+            y = self.y0 - int(level * self.gain[channel, 0] + self.offset[channel, 0])
+        clip = surface.get_clip()
+        surface.set_clip(self.rect())
+        pygame.draw.line(surface, color, (x, self.ylim[0]), (x, self.ylim[0] + 10), 3)
+        pygame.draw.line(surface, color, (self.xlim[0], y), (self.xlim[0] + 10, y), 3)
+        surface.set_clip(clip)
 
     def draw(self, surface, samples):
         surface.blit(self.bg, self.rect())
-        count = (self.xlim[1] - self.xlim[0] + self.step - 1) // self.step
-        scale = (self.ylim[1] - self.ylim[0]) * 0.01
-        p0 = [(self.xlim[0] + i * self.step, self.y0 - int(scale * v[0])) for i, v in enumerate(samples[-count:])]
-        p1 = [(self.xlim[0] + i * self.step, self.y0 - int(scale * v[1])) for i, v in enumerate(samples[-count:])]
-        p2 = [(self.xlim[0] + i * self.step, self.y0 - int(scale * v[2])) for i, v in enumerate(samples[-count:])]
-        #p3 = [(self.xlim[0] + i, self.y0) for i, v in enumerate(samples)]
-        pygame.draw.lines(surface, (200, 200, 0), False, p0)
-        pygame.draw.lines(surface, (0, 200, 0), False, p1)
-        pygame.draw.lines(surface, (0, 200, 200), False, p2)
-        #pygame.draw.lines(surface, (0, 0, 200), False, p3)
+        # anything that isn't a (N, channels) array, e.g. a list of tuples
+        samples = np.asarray(samples, np.float32)
+        count = self.span()
+        v = samples[-count:].T
+        n = v.shape[1]
+        if n < 2:
+            return self.rect()
+        self._points(count, v.shape[0])
+        np.copyto(self.fy[:, :n], v)
+        self._lines(surface, n)
+        return self.rect()
+
+    def draw_envelope(self, surface, lo, hi):
+        # one column per (lo, hi) pair, the trace zig-zags from max to min
+        surface.blit(self.bg, self.rect())
+        n = 2 * min(len(lo), self.columns())
+        if n < 2:
+            return self.rect()
+        self._points(2 * self.columns(), lo.shape[1])
+        np.copyto(self.fy[:, 0:n:2], hi[-n // 2:].T)
+        np.copyto(self.fy[:, 1:n:2], lo[-n // 2:].T)
+        self._lines(surface, n)
         return self.rect()
 
+    def _bins(self, bins, log):
+        # first FFT bin of every pixel column, linear or log frequency from
+        # the first bin up, columns narrower than a bin repeat it
+        if self.bin_key != (bins, log, self.columns()):
+            if log:
+                edges = np.geomspace(1, bins, self.columns() + 1)
+            else:
+                edges = np.linspace(0, bins, self.columns() + 1)
+            self.bin_start = np.minimum(edges[:-1].astype(np.intp), bins - 1)
+            self.bin_key = (bins, log, self.columns())
+        return self.bin_start
+
+    def draw_spectrum(self, surface, db, peak=None, log=False, top=40, span=100):
+        # db as [channel, bin], every pixel column shows the highest of the
+        # bins it covers, top dB at the top of the screen and span dB over
+        # its height, the peak hold dimmed behind the spectrum
+        surface.blit(self.bg, self.rect())
+        start = self._bins(db.shape[1], log)
+        cols = len(start)
+        self._points(cols, len(db), 1)
+        k = (self.ylim[1] - self.ylim[0]) / span
+        y = self.pts[:, :, 1]
+        dim = [tuple(v // 2 for v in c) for c in self.channel_colors]
+        for values, colors in ((peak, dim), (db, self.channel_colors)):
+            if values is None:
+                continue
+            np.maximum.reduceat(values, start, axis=1, out=self.fy)
+            np.subtract(top, self.fy, out=self.fy)
+            np.multiply(self.fy, k, out=self.fy)
+            np.add(self.fy, self.ylim[0], out=self.fy)
+            np.clip(self.fy, self.ylim[0], self.ylim[1], out=self.fy)
+            np.copyto(y, self.fy, casting='unsafe')
+            self._polylines(surface, cols, colors)
+        return self.rect()
+
+class Phosphor (object):
+    # Intensity graded persistence for a Scope. Every trace added is
+    # rasterised as one vertical span of pixels per column into hit counts,
+    # which decay by the same factor every frame. The spans go into a
+    # difference buffer as +1/-1 at their ends and are summed up once per
+    # frame over just the columns and rows a channel touched, so the cost of
+    # a frame doesn't depend on how many traces went into it.
+    #
+    # Channels share one level per pixel, it shows the color of the channel
+    # that hit it last. Level is in 1/scale hits and kept in integers, decay
+    # included. Channel and level make up the index into a table of screen
+    # pixel values per channel, from black through the trace color at half
+    # intensity to white on a log scale, which goes straight onto the
+    # surface. Black is transparent, the grid shows wherever nothing was hit.
+
+    decays = [.5, .8, .9, .95, .98, .99]
+    # distinct colors per channel and level steps per hit
+    shades = 64
+    scale = 8
+
+    def __init__(self, scope, decay=.9):
+        self.scope = scope
+        self.decay = decay
+        self.rect = pygame.Rect(scope.xlim[0], scope.ylim[0], scope.xlim[1] - scope.xlim[0] + 1, scope.ylim[1] - scope.ylim[0] + 1)
+        w, h = self.rect.size
+        self.surface = textcache.display_format(pygame.Surface(self.rect.size))
+        if self.surface.get_bytesize() == 3:
+            # no 2d pixel view of those
+            self.surface = pygame.Surface(self.rect.size, 0, 32)
+        self.surface.set_colorkey((0, 0, 0))
+        # row by row like the surface, a column is summed going down
+        self.level = np.zeros((h, w), np.int32)
+        self.channel = np.zeros((h, w), np.int32)
+        self.index = np.empty((h, w), np.int32)
+        self.hit = np.empty((h, w), np.int32)
+        self.diff = np.zeros((h + 1) * w, np.int32)
+        # 255 hits are white, more don't count
+        self.top = 255 * self.scale
+        t = np.log2(1 + np.arange(self.top + 1) / self.scale) / 4
+        self.shade = np.rint(t / 2 * (self.shades - 1)).astype(np.intp)
+        self.colors = None
+        self.clear()
+
+    def clear(self):
+        self.level[:] = 0
+        self.spans = []
+
+    def set_decay(self, decay):
+        self.decay = decay
+
+    def _palette(self):
+        colors = self.scope.channel_colors
+        if colors == self.colors:
+            return
+        self.colors = list(colors)
+        t = np.linspace(0, 2, self.shades).reshape(-1, 1)
+        mapped = []
+        for c in colors:
+            c = np.array(c, np.float32)
+            rgb = np.rint(c * np.minimum(t, 1) + (255 - c) * np.clip(t - 1, 0, 1)).astype(np.uint8)
+            mapped.append([self.surface.map_rgb(tuple(v)) for v in rgb])
+        # (channel, level) flattened, channel is kept as the offset of its row
+        self.palette = np.array(mapped, pygame.surfarray.pixels2d(self.surface).dtype)[:, self.shade].ravel()
+
+    def _spans(self, x, a, b):
+        # a vertical span from row a to row b (screen pixels, either way
+        # round) in column x for every trace and channel, a and b are
+        # [..., channel, column]
+        w, h = self.rect.size
+        lo = np.clip(np.minimum(a, b) - self.rect.top, 0, h - 1)
+        hi = np.clip(np.maximum(a, b) - self.rect.top, 0, h - 1)
+        x = np.clip(x - self.rect.left, 0, w - 1)
+        for c in range(a.shape[-2]):
+            lo_c = lo[..., c, :]
+            self.spans.append((c, np.broadcast_to(x, lo_c.shape).ravel(), lo_c.ravel(), hi[..., c, :].ravel()))
+
+    def _rows(self, v):
+        # screen rows of values [..., channel, sample]
+        return np.rint(self.scope.y0 - (v * self.scope.gain + self.scope.offset)).astype(np.intp)
+
+    def add(self, samples):
+        # traces as (N, channels) or (traces, N, channels) at the scope's step
+        scope = self.scope
+        v = np.swapaxes(np.asarray(samples, np.float32)[..., -scope.span():, :], -1, -2)
+        n = v.shape[-1]
+        if n < 2:
+            return
+        scope._points(n, v.shape[-2])
+        y = scope.y0 - (v * scope.gain + scope.offset)
+        # linear in between samples, one value per pixel column
+        cols = min(scope.columns(), int((n - 1) * scope.step) + 1)
+        pos = np.arange(cols) / scope.step
+        i = np.minimum(pos.astype(np.intp), n - 2)
+        f = (pos - i).astype(np.float32)
+        y = y[..., i] * (1 - f) + y[..., i + 1] * f
+        y = np.rint(y).astype(np.intp)
+        x = scope.xlim[0] + np.arange(cols)
+        # every column reaches over to where the next one starts
+        self._spans(x[:-1], y[..., :-1], y[..., 1:])
+
+    def add_envelope(self, lo, hi):
+        # min/max columns as for Scope.draw_envelope
+        scope = self.scope
+        n = min(len(lo), scope.columns())
+        if n < 1:
+            return
+        scope._points(2 * scope.columns(), lo.shape[1])
+        x = scope.xlim[0] + np.arange(n)
+        self._spans(x, self._rows(lo[-n:].T), self._rows(hi[-n:].T))
+
+    def _pixels(self, c, x, lo, n, step):
+        # every pixel of spans n long from row lo down
+        w = self.rect.width
+        end = np.cumsum(n)
+        i = np.repeat(lo * w + x - (end - n) * w, n) + np.arange(end[-1]) * w
+        np.add.at(self.level.reshape(-1), i, step)
+        self.channel.reshape(-1)[i] = c * (self.top + 1)
+
+    def draw(self, surface, hold=False):
+        # held, what's there doesn't fade
+        self._palette()
+        if not hold:
+            # fixed point decay, rounding down so a level runs out
+            self.level *= int(self.decay * (1 << 16))
+            self.level >>= 16
+        step = np.int32(self.scale)
+        for c, x, lo, hi in self.spans:
+            if len(x) == 0:
+                continue
+            x0, x1 = x.min(), x.max() + 1
+            y0, y1 = lo.min(), hi.max() + 1
+            n = hi - lo + 1
+            if n.sum() * 4 < (x1 - x0) * (y1 - y0):
+                # a thin trace, cheaper pixel by pixel than over the box
+                self._pixels(c, x, lo, n, step)
+                continue
+            # over the box the channel's spans are in, the difference buffer
+            # is left all zero again for the next one
+            w = x1 - x0
+            d = self.diff[:(y1 - y0 + 1) * w]
+            np.add.at(d, (lo - y0) * w + x - x0, step)
+            np.add.at(d, (hi + 1 - y0) * w + x - x0, -step)
+            d = d.reshape(-1, w)
+            hits = np.cumsum(d[:-1], axis=0, dtype=np.int32)
+            d[:] = 0
+            self.level[y0:y1, x0:x1] += hits
+            # the channel where it was hit, without a mask
+            channel = self.channel[y0:y1, x0:x1]
+            hit = self.hit[y0:y1, x0:x1]
+            np.minimum(hits, 1, out=hit)
+            np.subtract(c * (self.top + 1), channel, out=hits)
+            hits *= hit
+            channel += hits
+        self.spans = []
+        np.minimum(self.level, self.top, out=self.level)
+        np.add(self.level, self.channel, out=self.index)
+        pixels = pygame.surfarray.pixels2d(self.surface)
+        np.take(self.palette, self.index, out=pixels.T, mode='clip')
+        del pixels
+        return surface.blit(self.surface, self.rect)
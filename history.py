@@ -0,0 +1,186 @@
+import numpy as np
+import os
+import tempfile
+
+def fitting(size, channels, dtype=np.float32):
+    # how many samples fit into size bytes of file, the index takes up to
+    # two thirds of what the samples do on top and the sums 16 bytes a chunk
+    per_sample = np.dtype(dtype).itemsize * 5 / 3 + 16 / History.chunk
+    return int(size // (channels * per_sample))
+
+class History (object):
+    # The last capacity samples of the stream for stop and scroll back, far
+    # more than the ring holds. Samples and index live in a memory mapped
+    # file, a temporary one unless a path is given, so they don't have to
+    # fit into memory all at once.
+    #
+    # The index is min/max per bin of 4, 16, 64, ... samples, each level
+    # built from the one below, down to the samples themselves. Adding a
+    # block only redoes the bins it touched and any window, however far out
+    # it's zoomed, is reduced from the level with just enough bins for the
+    # pixel columns, so looking at history costs about the same at any zoom.
+    #
+    # The sums of the samples and their squares up to the end of every chunk
+    # go along, so statistics of any window cost about the same too.
+
+    fan = 4
+    chunk = 64
+
+    def __init__(self, capacity, channels, dtype=np.float32, columns=1024, path=None):
+        self.capacity = capacity
+        self.channels = channels
+        # all the levels with at least columns bins
+        self.decimations = []
+        d = self.fan
+        while capacity // d >= columns:
+            self.decimations.append(d)
+            d = d * self.fan
+        sizes = [capacity] + [2 * (capacity // d) for d in self.decimations]
+        itemsize = np.dtype(dtype).itemsize
+        # one more chunk than it takes, the one before the oldest sample's
+        # might still be needed
+        self.chunks = capacity // self.chunk + 2
+        self.file = open(path, 'w+b') if path else tempfile.TemporaryFile(prefix='pyscope-history-')
+        size = sum(sizes) * channels * itemsize + self.chunks * 2 * channels * 8
+        try:
+            # allocated up front, not when acquisition first gets there
+            os.posix_fallocate(self.file.fileno(), 0, size)
+        except (AttributeError, OSError):
+            self.file.truncate(size)
+        self.arrays = []
+        offset = 0
+        for size in sizes:
+            self.arrays.append(np.memmap(self.file, dtype, 'r+', offset, (size, channels)))
+            offset = offset + size * channels * itemsize
+        self.samples = self.arrays[0]
+        # lo and hi per level
+        self.levels = [(a[:len(a) // 2], a[len(a) // 2:]) for a in self.arrays[1:]]
+        # sum and sum of squares up to the end of each chunk, or the last
+        # sample of one that's not full yet
+        self.sums = np.memmap(self.file, np.float64, 'r+', offset, (self.chunks, 2, channels))
+        self.total = np.zeros((2, channels))
+        self.count = 0
+
+    def close(self):
+        del self.samples
+        del self.levels
+        del self.arrays
+        del self.sums
+        self.file.close()
+
+    def written(self):
+        return self.count
+
+    def oldest(self):
+        # index of the oldest sample still around
+        return max(0, self.count - self.capacity)
+
+    def _take(self, a, start, count):
+        return a[np.arange(start, start + count) % len(a)]
+
+    def _put(self, a, start, values):
+        a[np.arange(start, start + len(values)) % len(a)] = values
+
+    def add(self, block):
+        block = np.asarray(block).reshape(-1, self.channels)
+        if len(block) == 0:
+            return
+        if len(block) > self.capacity:
+            self.count += len(block) - self.capacity
+            block = block[-self.capacity:]
+        start = self.count
+        self._put(self.samples, start, block)
+        self.count = start + len(block)
+        # every level redoes its bins from the first one the block touched,
+        # out of the level below, the first of them might already have part
+        # of its samples from before
+        lo = hi = self.samples
+        d_below = 1
+        for d, (lo_k, hi_k) in zip(self.decimations, self.levels):
+            b0 = start // d
+            f = d // d_below
+            i0 = b0 * f
+            i1 = (self.count + d_below - 1) // d_below
+            cuts = np.arange(0, i1 - i0, f)
+            self._put(lo_k, b0, np.minimum.reduceat(self._take(lo, i0, i1 - i0), cuts))
+            self._put(hi_k, b0, np.maximum.reduceat(self._take(hi, i0, i1 - i0), cuts))
+            lo, hi, d_below = lo_k, hi_k, d
+        # as Measure.add does
+        v = block.astype(np.float64)
+        carry = -start % self.chunk
+        cuts = np.arange(carry, len(v), self.chunk)
+        if carry:
+            cuts = np.concatenate(([0], cuts))
+        sums = np.stack((np.add.reduceat(v, cuts, axis=0), np.add.reduceat(v * v, cuts, axis=0)), 1)
+        np.cumsum(sums, axis=0, out=sums)
+        sums += self.total
+        self.sums[(start + cuts) // self.chunk % self.chunks] = sums
+        self.total = sums[-1]
+
+    def at(self, start, count):
+        # a copy of count samples from start on
+        return self._take(self.samples, start, count)
+
+    def envelope(self, start, count, columns):
+        # (lo, hi) per pixel column over the count samples from start on,
+        # as (columns, channels), count should be at least columns
+        per = count / columns
+        lo = hi = self.samples
+        d = 1
+        for k, dk in enumerate(self.decimations):
+            if dk > per:
+                break
+            lo, hi = self.levels[k]
+            d = dk
+        # the bin start is in might have had its slot taken by the newest
+        # one already, then the window starts with the first bin still kept
+        b0 = max(start // d, (self.count - 1) // d - len(lo) + 1)
+        b1 = (start + count + d - 1) // d
+        edges = np.arange(columns) * (b1 - b0) // columns
+        return (np.minimum.reduceat(self._take(lo, b0, b1 - b0), edges),
+                np.maximum.reduceat(self._take(hi, b0, b1 - b0), edges))
+
+    def _before(self, i):
+        # sum and sum of squares of the samples before i, from the sums of
+        # the chunk i is in less what comes after i in it
+        if i == self.count:
+            return self.total
+        c = i // self.chunk
+        v = self.at(i, min((c + 1) * self.chunk, self.count) - i).astype(np.float64)
+        return self.sums[c % self.chunks] - np.stack((v.sum(axis=0), (v * v).sum(axis=0)))
+
+    def _extremes(self, start, end):
+        # min and max from start to end out of the coarsest bins that fit in
+        # whole, finer ones and the samples make up the edges
+        lo = []
+        hi = []
+        levels = [(self.samples, self.samples)] + self.levels
+        d = 1
+        for k, (lo_k, hi_k) in enumerate(levels):
+            parts = [(start, end)]
+            if k < len(self.decimations):
+                f = self.decimations[k] // d
+                d = self.decimations[k]
+                # the first bin still kept, as in envelope()
+                kept = (self.count - 1) // d - len(levels[k + 1][0]) + 1
+                s = max(-(-start // f), kept)
+                e = end // f
+                if s < e:
+                    parts = [(start, s * f), (e * f, end)]
+            for a, b in parts:
+                if b > a:
+                    lo.append(self._take(lo_k, a, b - a).min(axis=0))
+                    hi.append(self._take(hi_k, a, b - a).max(axis=0))
+            if len(parts) == 1:
+                break
+            start, end = s, e
+        return np.min(lo, axis=0), np.max(hi, axis=0)
+
+    def stats(self, start, count):
+        # {name: per channel values} of the count samples from start on,
+        # as Measure.stats but for the frequency, None if there are none
+        if count <= 0:
+            return None
+        lo, hi = self._extremes(start, start + count)
+        s, q = (self._before(start + count) - self._before(start)) / count
+        return {'min': lo, 'max': hi, 'pp': hi - lo, 'mean': s, 'rms': np.sqrt(np.maximum(q, 0))}
@@ -0,0 +1,188 @@
+import capture
+import numpy as np
+import source
+import time
+
+# Burst reads from the LSM303 accelerometer FIFO. adafruit_lsm303_accel only
+# deals in single samples, it's still used for all the configuration and this
+# just talks to the same i2c_device.
+
+REG_CTRL5 = 0x24
+REG_OUT_X_L = 0x28
+REG_FIFO_CTRL = 0x2E
+REG_FIFO_SRC = 0x2F
+
+AUTO_INCREMENT = 0x80
+FIFO_EN = 0x40
+FIFO_STREAM = 0x80
+FIFO_OVRN = 0x40
+FIFO_FSS = 0x1F
+FIFO_DEPTH = 32
+
+GRAVITY = 0.00980665
+
+# index as in the 'Freq' setting
+RATE_HZ = [1, 10, 25, 50, 100, 200, 400, 1344, 1620]
+
+# (mg/lsb, shift) indexed by [mode][range], same order as the 'NORMAL',
+# 'HIRES', 'LOWPO' combobox and the 'Rnge' setting
+SCALE = [
+        [(3.9, 6), (7.82, 6), (15.63, 6), (46.9, 6)],
+        [(0.98, 4), (1.95, 4), (3.9, 4), (11.72, 4)],
+        [(15.63, 8), (31.26, 8), (62.52, 8), (187.58, 8)],
+        ]
+
+NAMES = ['X', 'Y', 'Z']
+
+# the acquisition controls, (cmd, label, values, current) as in
+# source.Source, the indices are what Fifo and the SCALE table go by
+CONTROLS = [
+        ('m', None, ['NORMAL', 'HIRES', 'LOWPO'], 'NORMAL'),
+        ('f', 'Freq', [f"{hz}Hz" for hz in RATE_HZ], '1620Hz'),
+        ('a', 'Rnge', ['2G', '4G', '8G', '16G'], '16G'),
+        ]
+
+class Fifo (object):
+
+    def __init__(self, acc, rate, rnge, mode):
+        self.dev = acc.i2c_device
+        self.rate = rate
+        self.rnge = rnge
+        self.mode = mode
+        self.src = bytearray(1)
+        self.overflows = 0
+        self.setup()
+
+    def _write(self, reg, val):
+        with self.dev as i2c:
+            i2c.write(bytes([reg, val]))
+
+    def _read(self, reg, buf):
+        with self.dev as i2c:
+            i2c.write_then_readinto(bytes([reg]), buf)
+
+    def setup(self):
+        # ~100 blocks per second, never more than half the FIFO so there's
+        # plenty of headroom while the block is being transferred
+        self.block = max(1, min(FIFO_DEPTH // 2, RATE_HZ[self.rate] // 100))
+        lsb, self.shift = SCALE[self.mode][self.rnge]
+        self.lsb = lsb * GRAVITY
+        self.raw = bytearray(6 * self.block)
+
+        ctrl5 = bytearray(1)
+        self._read(REG_CTRL5, ctrl5)
+        self._write(REG_CTRL5, ctrl5[0] | FIFO_EN)
+        # going through bypass mode empties the FIFO, so samples taken with
+        # the previous settings don't end up in the next block
+        self._write(REG_FIFO_CTRL, 0)
+        self._write(REG_FIFO_CTRL, FIFO_STREAM | (self.block & FIFO_FSS))
+
+    def configure(self, rate=None, rnge=None, mode=None):
+        if rate is not None:
+            self.rate = rate
+        if rnge is not None:
+            self.rnge = rnge
+        if mode is not None:
+            self.mode = mode
+        self.setup()
+
+    def read(self):
+        # Waits for a full block and returns it as (block, t) with t the
+        # monotonic ns timestamp of the last sample in the block.
+        hz = RATE_HZ[self.rate]
+        while True:
+            self._read(REG_FIFO_SRC, self.src)
+            if self.src[0] & FIFO_OVRN:
+                self.overflows += 1
+                avail = FIFO_DEPTH
+            else:
+                avail = self.src[0] & FIFO_FSS
+            if avail >= self.block:
+                break
+            time.sleep((self.block - avail) / hz)
+        t = time.monotonic_ns() - (avail - self.block) * 1000000000 // hz
+        # with the FIFO enabled the auto increment wraps from OUT_Z_H back to
+        # OUT_X_L, so one transfer pulls the whole block
+        self._read(REG_OUT_X_L | AUTO_INCREMENT, self.raw)
+        raw = np.frombuffer(self.raw, '<i2').reshape(-1, 3)
+        return ((raw >> self.shift) * self.lsb, t)
+
+class Accel (source.Source):
+    names = NAMES
+    controls = CONTROLS
+
+    def run(self, data, ctrl, run):
+        rec = None
+        try:
+            import board
+            import adafruit_lsm303_accel
+
+            DATA_RATE = [
+                    adafruit_lsm303_accel.Rate.RATE_1_HZ,
+                    adafruit_lsm303_accel.Rate.RATE_10_HZ,
+                    adafruit_lsm303_accel.Rate.RATE_25_HZ,
+                    adafruit_lsm303_accel.Rate.RATE_50_HZ,
+                    adafruit_lsm303_accel.Rate.RATE_100_HZ,
+                    adafruit_lsm303_accel.Rate.RATE_200_HZ,
+                    adafruit_lsm303_accel.Rate.RATE_400_HZ,
+                    adafruit_lsm303_accel.Rate.RATE_1344_HZ,
+                    adafruit_lsm303_accel.Rate.RATE_1620_HZ,
+                    ]
+
+            RANGE = [
+                    adafruit_lsm303_accel.Range.RANGE_2G,
+                    adafruit_lsm303_accel.Range.RANGE_4G,
+                    adafruit_lsm303_accel.Range.RANGE_8G,
+                    adafruit_lsm303_accel.Range.RANGE_16G,
+                    ]
+
+            MODE = [
+                    adafruit_lsm303_accel.Mode.MODE_NORMAL,
+                    adafruit_lsm303_accel.Mode.MODE_HIGH_RESOLUTION,
+                    adafruit_lsm303_accel.Mode.MODE_LOW_POWER,
+                    ]
+
+            i2c = board.I2C()
+            acc = adafruit_lsm303_accel.LSM303_Accel(i2c)
+            acc.data_rate = adafruit_lsm303_accel.Rate.RATE_1620_HZ
+            fifo = Fifo(acc, DATA_RATE.index(acc.data_rate), RANGE.index(acc.range), MODE.index(acc.mode))
+            ctrl.ack('f', fifo.rate)
+            ctrl.ack('a', fifo.rnge)
+            ctrl.ack('m', fifo.mode)
+            while run.value:
+                block, t = fifo.read()
+                if fifo.overflows:
+                    # the block carries on as if nothing was missing, the
+                    # metrics at least say something was
+                    data.lose('overflows', fifo.overflows)
+                    fifo.overflows = 0
+                if rec and not rec.put(block, data.written(), t, RATE_HZ[fifo.rate], fifo.rnge, fifo.mode):
+                    data.lose('rec_dropped')
+                data.write(block, t)
+                for cmd, val in ctrl.get():
+                    # whatever the sensor reads back is what gets acknowledged
+                    if cmd == 'f':
+                        acc.data_rate = DATA_RATE[val]
+                        fifo.configure(rate=DATA_RATE.index(acc.data_rate))
+                        ctrl.ack(cmd, fifo.rate)
+                    elif cmd == 'a':
+                        acc.range = RANGE[val]
+                        fifo.configure(rnge=RANGE.index(acc.range))
+                        ctrl.ack(cmd, fifo.rnge)
+                    elif cmd == 'm':
+                        acc.mode = MODE[val]
+                        fifo.configure(mode=MODE.index(acc.mode))
+                        ctrl.ack(cmd, fifo.mode)
+                    elif cmd == 'r':
+                        rec = capture.record(rec, val, self.channels, (RATE_HZ[fifo.rate], fifo.rnge, fifo.mode))
+                        ctrl.ack(cmd, 1 if rec else 0)
+                    else:
+                        print(f"Unknown command {cmd} : {val}")
+        except:
+            if rec:
+                rec.close()
+            # no sensor, make something up
+            import synth
+            return synth.Synth(seed=None).run(data, ctrl, run)
+        if rec:
+            rec.close()
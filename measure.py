@@ -0,0 +1,122 @@
+import numpy as np
+
+class Measure (object):
+    # Running statistics per channel over the last n samples of the stream,
+    # for any n up to history, fed block by block as it arrives.
+    #
+    # The stream is cut into chunks of chunk samples. Every chunk keeps its
+    # min and max and the running sums of the samples and their squares up
+    # to its end, so a block costs a few reductions over the block, and mean
+    # and RMS of a window are the difference of two sums. Windows start on a
+    # chunk boundary.
+    #
+    # The frequency comes from where the signal crosses its mean going up,
+    # with hysteresis like the trigger. Mean and hysteresis are taken from
+    # the last stats() and the crossings are kept as sample positions.
+
+    def __init__(self, channels, history=1 << 22, chunk=64, crossings=4096):
+        self.chunk = chunk
+        self.chunks = history // chunk
+        self.lo = np.zeros((self.chunks, channels), np.float32)
+        self.hi = np.zeros((self.chunks, channels), np.float32)
+        # sum and sum of squares from the start up to the end of each chunk
+        self.sums = np.zeros((self.chunks, 2, channels), np.float64)
+        self.total = np.zeros((2, channels), np.float64)
+        self.count = 0
+        self.cross = np.zeros((channels, crossings), np.int64)
+        self.cross_count = np.zeros(channels, np.int64)
+        self.center = None
+        self.hysteresis = None
+        self.armed = np.zeros(channels, bool)
+
+    def add(self, block):
+        v = np.asarray(block, np.float64)
+        n = len(v)
+        if n == 0:
+            return
+        start = self.count
+        # where new chunks start in the block, the first piece might carry
+        # on with the chunk from last time
+        carry = -start % self.chunk
+        cuts = np.arange(carry, n, self.chunk)
+        if carry:
+            cuts = np.concatenate(([0], cuts))
+        slots = (start + cuts) // self.chunk % self.chunks
+        lo = np.minimum.reduceat(v, cuts, axis=0)
+        hi = np.maximum.reduceat(v, cuts, axis=0)
+        if carry:
+            np.minimum(lo[0], self.lo[slots[0]], out=lo[0])
+            np.maximum(hi[0], self.hi[slots[0]], out=hi[0])
+        self.lo[slots] = lo
+        self.hi[slots] = hi
+        sums = np.stack((np.add.reduceat(v, cuts, axis=0), np.add.reduceat(v * v, cuts, axis=0)), 1)
+        np.cumsum(sums, axis=0, out=sums)
+        sums += self.total
+        self.sums[slots] = sums
+        self.total = sums[-1]
+        self._crossings(v, start)
+        self.count += n
+
+    def _crossings(self, v, start):
+        if self.center is None:
+            # nothing measured yet, go by the first block
+            self.center = v.mean(axis=0)
+            self.hysteresis = (v.max(axis=0) - v.min(axis=0)) * .1
+        above = v >= self.center + self.hysteresis
+        below = v < self.center - self.hysteresis
+        # the same as Trigger.scan for all channels at once, -1 stands for
+        # whatever happened before this block
+        idx = np.arange(len(v)).reshape(-1, 1)
+        before_below = np.where(self.armed, -1, -2)
+        before_above = np.where(self.armed, -2, -1)
+        last_below = np.maximum.accumulate(np.where(below, idx, before_below), axis=0)
+        last_above = np.maximum.accumulate(np.where(above, idx, before_above), axis=0)
+        prev_above = np.concatenate((before_above.reshape(1, -1), last_above[:-1]))
+        self.armed = last_below[-1] > last_above[-1]
+        hits = above & (last_below > prev_above)
+        size = self.cross.shape[1]
+        for c in range(v.shape[1]):
+            pos = (np.flatnonzero(hits[:, c]) + start)[-size:]
+            self.cross[c, (self.cross_count[c] + np.arange(len(pos))) % size] = pos
+            self.cross_count[c] += len(pos)
+
+    def _frequency(self, c, start, rate):
+        size = self.cross.shape[1]
+        m = min(self.cross_count[c], size)
+        pos = self.cross[c, (self.cross_count[c] - m + np.arange(m)) % size]
+        pos = pos[np.searchsorted(pos, start):]
+        if len(pos) < 2:
+            return np.nan
+        return (len(pos) - 1) / (pos[-1] - pos[0]) * (rate or 1)
+
+    def stats(self, n, rate=None):
+        # {name: per channel values} over the last n samples (or fewer if
+        # there aren't as many), None before the first block. The frequency
+        # is in Hz with a rate, per sample without, nan if there's less than
+        # a period.
+        n = min(n, self.count, (self.chunks - 2) * self.chunk)
+        if n <= 0:
+            return None
+        last = (self.count - 1) // self.chunk
+        first = (self.count - n) // self.chunk
+        slots = np.arange(first, last + 1) % self.chunks
+        lo = self.lo[slots].min(axis=0)
+        hi = self.hi[slots].max(axis=0)
+        s, q = self.total - self.sums[(first - 1) % self.chunks] if first > 0 else self.total
+        count = self.count - first * self.chunk
+        mean = s / count
+        rms = np.sqrt(np.maximum(q / count, 0))
+        freq = np.array([self._frequency(c, first * self.chunk, rate) for c in range(len(mean))])
+        self.center = mean
+        self.hysteresis = (hi - lo) * .1
+        return {'min': lo, 'max': hi, 'pp': hi - lo, 'mean': mean, 'rms': rms, 'freq': freq}
+
+def frequency(block, center, hysteresis, rate=None):
+    # per channel, of a block (N, channels) that's at hand, say out of the
+    # history, crossing center going up as Measure does
+    v = np.asarray(block, np.float64)
+    m = Measure(v.shape[1], 3 * 64, crossings=len(v) // 2 + 1)
+    m.center = center
+    m.hysteresis = hysteresis
+    m._crossings(v, 0)
+    return np.array([m._frequency(c, 0, rate) for c in range(v.shape[1])])
@@ -0,0 +1,118 @@
+import numpy as np
+import source
+import time
+
+class Input (object):
+    # One source ring as the merger sees it, the stamps that are still
+    # needed turned around into a map from time to sample index
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.seen = 0
+        self.idx = np.zeros(0, np.int64)
+        self.t = np.zeros(0, np.int64)
+        self.first = None
+
+    def update(self):
+        new = self.ring.stamps_since(self.seen)
+        self.seen = self.ring.stamp_count()
+        if len(new):
+            self.idx = np.concatenate((self.idx, new[:, 0]))
+            self.t = np.concatenate((self.t, new[:, 1]))
+            if self.first is None:
+                self.first = int(new[0, 1])
+
+    def last(self):
+        return int(self.t[-1]) if len(self.t) else None
+
+    def rate(self):
+        if len(self.t) < 2 or self.t[-1] <= self.t[0]:
+            return None
+        return (self.idx[-1] - self.idx[0]) * 1e9 / (self.t[-1] - self.t[0])
+
+    def resample(self, t):
+        # values at the times t (ns) as (len(t), channels), linear in between
+        # samples, the last stamped sample held past the end, zeros before
+        # the source delivered anything
+        if not len(self.t):
+            return np.zeros((len(t), self.ring.channels), np.float32)
+        x = np.interp(t, self.t, self.idx)
+        oldest = self.ring.written() - self.ring.capacity
+        x = np.maximum(x, oldest)
+        i = x.astype(np.int64)
+        f = (x - i).astype(np.float32).reshape(-1, 1)
+        start = int(i[0])
+        count = int(i[-1]) + 2 - start
+        view = self.ring.at(start, min(count, self.ring.written() - start))
+        if view is None:
+            # lapped in the meantime, it's lost like any overrun
+            return np.zeros((len(t), self.ring.channels), np.float32)
+        i = i - start
+        j = np.minimum(i + 1, len(view) - 1)
+        out = view[i] * (1 - f) + view[j] * f
+        # the stamp before the end is all the next call needs from here
+        k = max(0, int(np.searchsorted(self.t, t[-1])) - 1)
+        self.idx = self.idx[k:]
+        self.t = self.t[k:]
+        return out
+
+class Merged (source.Source):
+    # Several sources, each acquiring in a process and ring of its own at
+    # its own rate, shown as one. run() resamples them onto a common
+    # timeline going by the acquisition stamps in their rings, so they
+    # all have to stamp their blocks, and writes their channels side by
+    # side into the ring the scope looks at.
+    #
+    # The timeline follows the source furthest behind, but never more than
+    # lag seconds behind the newest. One that's further behind than that,
+    # on a stalled bus say, holds its last value and what it delivers late
+    # is dropped, so it can't hold up the others. The timeline starts with
+    # the first sources to deliver, one that hasn't yet reads zero. Without
+    # a rate it's the highest of those that have delivered.
+
+    def __init__(self, sources, rings, rate=None, lag=.25, interval=.005):
+        self.rings = rings
+        self.channels = sum(s.channels for s in sources)
+        self.dtype = np.float32
+        # the highest of the sources unless given
+        rates = [s.rate for s in sources]
+        self.rate = rate or (max(rates) if all(rates) else None)
+        self.names = [f"{i}{name}" for i, s in enumerate(sources) for name in s.channel_names()]
+        # the first source to have a command decides how it looks
+        controls = {}
+        for s in sources:
+            for c in s.controls:
+                controls.setdefault(c[0], c)
+        self.controls = list(controls.values())
+        self.lag = lag
+        self.interval = interval
+
+    def run(self, data, ctrl, run):
+        inputs = [Input(r) for r in self.rings]
+        rate = self.rate
+        t0 = None
+        n = 0
+        while run.value:
+            time.sleep(self.interval)
+            for i in inputs:
+                i.update()
+            last = [i.last() for i in inputs if i.last() is not None]
+            if not last:
+                continue
+            if rate is None:
+                rates = [i.rate() for i in inputs if i.rate() is not None]
+                if not rates:
+                    continue
+                rate = max(rates)
+            if t0 is None:
+                t0 = max(i.first for i in inputs if i.first is not None)
+            end = max(min(last), max(last) - self.lag * 1e9)
+            total = int((end - t0) * rate / 1e9) + 1
+            # fallen behind by more than half the ring, skip ahead
+            n = max(n, total - data.capacity // 2)
+            count = total - n
+            if count <= 0:
+                continue
+            t = t0 + (n + np.arange(count)) * (1e9 / rate)
+            data.write(np.concatenate([i.resample(t) for i in inputs], axis=1), int(t[-1]))
+            n = n + count
@@ -0,0 +1,197 @@
+import collections
+import csv
+import json
+import numpy as np
+import socket
+import time
+
+class Histogram (object):
+    # log2 buckets - adding a value is a bit_length() and an increment, good
+    # enough to feed on every frame and to tell 1ms from 10ms apart
+
+    def __init__(self, scale=1):
+        self.scale = scale
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * 65
+        self.n = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        value = max(0, int(value))
+        self.counts[value.bit_length()] += 1
+        self.n += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        # upper edge of the bucket the p-th percentile falls into
+        target = p * self.n / 100
+        acc = 0
+        for b, c in enumerate(self.counts):
+            acc += c
+            if acc >= target:
+                return min(self.max, (1 << b) - 1)
+        return self.max
+
+    def summary(self):
+        if not self.n:
+            return {'n': 0, 'mean': 0, 'p50': 0, 'p99': 0, 'max': 0}
+        return {
+                'n': self.n,
+                'mean': self.total / self.n * self.scale,
+                'p50': self.percentile(50) * self.scale,
+                'p99': self.percentile(99) * self.scale,
+                'max': self.max * self.scale,
+                }
+
+class Metrics (object):
+    # Per frame instrumentation of the main loop. The loop calls begin() once
+    # it's time for a frame and lap() after each stage, the histograms are
+    # summarised and reset every interval seconds and handed to the sink.
+    # Stage timings are in ms, depth in samples.
+
+    stages = ['wait', 'events', 'drain', 'scope', 'widgets', 'display']
+
+    def __init__(self, sink=None, interval=1):
+        self.sink = sink
+        self.interval = interval
+        # created up front so every summary has the same fields
+        self.hist = collections.OrderedDict()
+        for name in self.stages:
+            self.hist[name + '_ms'] = Histogram(1e-6)
+        self.hist['depth'] = Histogram()
+        self.hist['jitter_ms'] = Histogram(1e-6)
+        self.counters = {}
+        self.last = time.perf_counter_ns()
+        self.due = time.monotonic() + interval
+        self.stamp_seen = None
+        self.summary = {}
+
+    def add(self, name, value, scale=1):
+        h = self.hist.get(name)
+        if h is None:
+            h = self.hist[name] = Histogram(scale)
+        h.add(value)
+
+    def begin(self):
+        # whatever happened since the end of the last frame is waiting
+        self.lap('wait')
+
+    def lap(self, name):
+        now = time.perf_counter_ns()
+        self.add(name + '_ms', now - self.last, 1e-6)
+        self.last = now
+
+    def ring(self, data):
+        # fill level, lost samples and how regularly the source delivers,
+        # judged by the spacing of the block stamps against their median
+        self.add('depth', data.depth())
+        self.counters['overruns'] = data.overruns()
+        count = data.stamp_count()
+        if self.stamp_seen is None:
+            self.stamp_seen = max(0, count - 1)
+        stamps = data.stamps_since(self.stamp_seen)
+        # keep the last one to pair up with the next frame's first
+        self.stamp_seen = max(0, count - 1)
+        if len(stamps) < 2:
+            return
+        di = np.diff(stamps[:, 0])
+        dt = np.diff(stamps[:, 1])
+        ok = di > 0
+        if not ok.any():
+            return
+        period = np.median(dt[ok] / di[ok])
+        for j in np.abs(dt[ok] - di[ok] * period):
+            self.add('jitter_ms', j, 1e-6)
+
+    def tick(self, **counters):
+        self.counters.update(counters)
+        if time.monotonic() < self.due:
+            return
+        self.due = self.due + self.interval
+        self.summary = dict(t=time.time(), **self.counters)
+        for name, h in self.hist.items():
+            self.summary[name] = h.summary()
+            h.reset()
+        if self.sink:
+            self.sink.write(self.summary)
+
+    def lines(self):
+        # for the overlay
+        out = []
+        for name, v in self.summary.items():
+            if isinstance(v, dict):
+                if v['n']:
+                    out.append(f"{name:>10} {v['mean']:7.2f} {v['p99']:7.2f} {v['max']:7.2f}")
+            elif name != 't':
+                out.append(f"{name:>10} {v}")
+        return out
+
+    def close(self):
+        if self.sink:
+            self.sink.close()
+
+class JsonSink (object):
+
+    def __init__(self, path):
+        self.f = open(path, 'a')
+
+    def write(self, record):
+        self.f.write(json.dumps(record) + '\n')
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+class CsvSink (object):
+    # one column per stat, the columns are fixed by the first record
+
+    def __init__(self, path):
+        self.f = open(path, 'a', newline='')
+        self.writer = None
+
+    def write(self, record):
+        row = {}
+        for name, v in record.items():
+            if isinstance(v, dict):
+                for k, x in v.items():
+                    row[f"{name}.{k}"] = x
+            else:
+                row[name] = v
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.f, list(row), extrasaction='ignore')
+            self.writer.writeheader()
+        self.writer.writerow(row)
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+class SocketSink (object):
+    # JSON datagrams to a local UNIX socket, nobody listening is fine
+
+    def __init__(self, path):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def write(self, record):
+        try:
+            self.sock.sendto(json.dumps(record).encode(), self.path)
+        except OSError:
+            pass
+
+    def close(self):
+        self.sock.close()
+
+def sink(target):
+    # 'unix:PATH', 'FILE.csv' or anything else for JSON lines
+    if target.startswith('unix:'):
+        return SocketSink(target[5:])
+    if target.endswith('.csv'):
+        return CsvSink(target)
+    return JsonSink(target)
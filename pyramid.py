@@ -0,0 +1,47 @@
+import numpy as np
+import ring
+
+class Pyramid (object):
+    # Min/max decimation of the sample stream. Level k holds bins of
+    # 2 ** (k + 1) samples and is built from pairs of bins of the level below,
+    # so feeding a block costs O(block) and looking at a zoomed out window
+    # never touches the raw samples again.
+
+    def __init__(self, levels, bins, channels, dtype=np.float32):
+        self.bins = bins
+        # stored per channel like the ring
+        self.lo = [np.zeros((channels, 2 * bins), dtype).T for _ in range(levels)]
+        self.hi = [np.zeros((channels, 2 * bins), dtype).T for _ in range(levels)]
+        self.count = [0] * levels
+        # a bin that didn't find its partner yet, per level
+        self.carry = [None] * levels
+
+    def max_decimation(self):
+        return 2 ** len(self.lo)
+
+    def add(self, block):
+        lo = hi = np.asarray(block)
+        for k in range(len(self.lo)):
+            if self.carry[k] is not None:
+                lo = np.concatenate((self.carry[k][0], lo))
+                hi = np.concatenate((self.carry[k][1], hi))
+                self.carry[k] = None
+            n = len(lo) & ~1
+            if n < len(lo):
+                # block might be a view into the sample ring, hold on to a copy
+                self.carry[k] = (lo[n:].copy(), hi[n:].copy())
+            if n == 0:
+                break
+            lo = np.minimum(lo[0:n:2], lo[1:n:2])
+            hi = np.maximum(hi[0:n:2], hi[1:n:2])
+            ring.mirror_write(self.lo[k], self.count[k], lo)
+            ring.mirror_write(self.hi[k], self.count[k], hi)
+            self.count[k] += len(lo)
+
+    def latest(self, decimation, count):
+        # (lo, hi) views of the last count bins of decimation samples each,
+        # decimation has to be a power of 2
+        k = decimation.bit_length() - 2
+        count = min(count, self.bins)
+        i = (self.count[k] - count) % self.bins
+        return (self.lo[k][i:i + count], self.hi[k][i:i + count])
@@ -1,246 +1,723 @@
 #!/usr/bin/python3
 
-import graph
+import argparse
 import multiprocessing as mp
-import numpy as np
 import os
-import pygame
-import queue
+import startup
+
+timing = startup.Timing()
+
+# The acquisition side comes first and gets going before pygame is even
+# imported, samples are flowing by the time the display is up. The touch
+# screen is looked for in the meantime.
+import capture
+import control
+import filters
+import json
+import lsm303
+import merge
+import numpy as np
 import random
+import ring
+import source
+import synth
 import time
-import widget
-
-
-def data_source(data, ctrl, run):
-    try:
-        import board
-        import adafruit_lsm303_accel
-
-        DATA_RATE = [
-                adafruit_lsm303_accel.Rate.RATE_1_HZ,
-                adafruit_lsm303_accel.Rate.RATE_10_HZ,
-                adafruit_lsm303_accel.Rate.RATE_25_HZ,
-                adafruit_lsm303_accel.Rate.RATE_50_HZ,
-                adafruit_lsm303_accel.Rate.RATE_100_HZ,
-                adafruit_lsm303_accel.Rate.RATE_200_HZ,
-                adafruit_lsm303_accel.Rate.RATE_400_HZ,
-                adafruit_lsm303_accel.Rate.RATE_1344_HZ,
-                adafruit_lsm303_accel.Rate.RATE_1620_HZ,
-                ]
-
-        RANGE = [
-                adafruit_lsm303_accel.Range.RANGE_2G,
-                adafruit_lsm303_accel.Range.RANGE_4G,
-                adafruit_lsm303_accel.Range.RANGE_8G,
-                adafruit_lsm303_accel.Range.RANGE_16G,
-                ]
-
-        MODE = [
-                adafruit_lsm303_accel.Mode.MODE_NORMAL,
-                adafruit_lsm303_accel.Mode.MODE_HIGH_RESOLUTION,
-                adafruit_lsm303_accel.Mode.MODE_LOW_POWER,
-                ]
-
-        i2c = board.I2C()
-        acc = adafruit_lsm303_accel.LSM303_Accel(i2c)
-        acc.data_rate = adafruit_lsm303_accel.Rate.RATE_1620_HZ
-        while run.value:
-            data.put(acc.acceleration)
-            if ctrl.empty():
-                time.sleep(.001)
-            else:
-                cmd, val = ctrl.get_nowait()
-                if cmd == 'f':
-                    acc.data_rate = DATA_RATE[val]
-                elif cmd == 'a':
-                    acc.range = RANGE[val]
-                elif cmd == 'm':
-                    acc.mode = MODE[val]
-                else:
-                    break
-    except:
-        x = 0
-        dx = 2 * np.pi / 1920
-        rng = np.random.default_rng()
-        scale = 5
-        noise = 1
-        period = .001
-        while run.value:
-            x = x + dx
-            if x > np.pi:
-                x = x - 2 * np.pi
-            s0 = 9 * scale * np.sin(x + 0 * np.pi / 3) + (rng.random() - .5) * noise * scale
-            s1 = 9 * scale * np.sin(x + 2 * np.pi / 3) + (rng.random() - .5) * noise * scale
-            s2 = 9 * scale * np.sin(x - 2 * np.pi / 3) + (rng.random() - .5) * noise * scale
-            data.put((s0, s1, s2))
-            if ctrl.empty():
-                time.sleep(period)
-            else:
-                cmd, val = ctrl.get_nowait()
-                if cmd == 'f':
-                    period = [.5, .2, .1, .05, .02, .01, .005, .002, .001][val]
-                elif cmd == 'a':
-                    scale = [0.625, 1.25, 2.5, 5][val]
-                elif cmd == 'm':
-                    noise = [1, 2, .5][val]
-                else:
-                    print(f"This sucks {cmd} : {val}")
-                    break
+import touch
+timing.mark('imports')
+
 
 def _setup_pygame(size=None):
+    # just the display and fonts, pygame.init() brings up sound and
+    # joysticks as well
     pygame.display.init()
-    pygame.font.init()
-    pygame.init()
 
     if size is None:
         screen_size = (pygame.display.Info().current_w, pygame.display.Info().current_h)
-        return (pygame.display.set_mode(screen_size, pygame.FULLSCREEN | pygame.DOUBLEBUF), screen_size)
-    return (pygame.display.set_mode(size, pygame.DOUBLEBUF), size)
+        screen = pygame.display.set_mode(screen_size, pygame.FULLSCREEN | pygame.DOUBLEBUF)
+    else:
+        screen_size = size
+        screen = pygame.display.set_mode(size, pygame.DOUBLEBUF)
+    pygame.font.init()
+    return (screen, screen_size)
 
-def setup_pygame(xSize):
+def setup_pygame(xSize, cache):
     disp_no = os.getenv('DISPLAY')
+    if os.getenv('SDL_VIDEODRIVER'):
+        # whatever the environment asks for, e.g. 'dummy' to run headless
+        return _setup_pygame(xSize)
     if disp_no and not os.getenv('SSH_CONNECTION'):
         print('Using X11 driver')
         return _setup_pygame(xSize)
     else:
-        for fp in ['fbcon', 'directfb', 'svgalib']:
+        drivers = ['fbcon', 'directfb', 'svgalib']
+        if cache.get('video_driver') in drivers:
+            # whatever worked last time goes first
+            drivers.remove(cache.get('video_driver'))
+            drivers.insert(0, cache.get('video_driver'))
+        for fp in drivers:
             os.putenv('SDL_VIDEODRIVER', fp)
             print(f"Attempting {fp}")
             try:
-                return _setup_pygame()
+                screen = _setup_pygame()
+                cache.set('video_driver', fp)
+                return screen
             except pygame.error:
-                pass
+                pygame.display.quit()
     raise Exception('setup_pygame failed')
 
 
-screen, screen_size = setup_pygame((1024, 600))
-scope = graph.Scope(min(1024, screen_size[0]), min(470, screen_size[1]))
-
-mouse_position = lambda event: event.pos
+parser = argparse.ArgumentParser()
+parser.add_argument('--flip', action='store_true', help='redraw everything and flip the whole screen every frame')
+parser.add_argument('--fps', type=float, default=30, help='target frame rate')
+parser.add_argument('--record', metavar='FILE', help='record everything from the start')
+parser.add_argument('--capture-dir', default='.', help='where the REC button puts its captures')
+parser.add_argument('--play', metavar='FILE', help='play back a capture instead of acquiring')
+parser.add_argument('--speed', type=float, default=1, help='playback speed, 0 for as fast as possible')
+parser.add_argument('--synth', type=float, action='append', metavar='HZ', help='deterministic synthetic data at this rate instead of acquiring, repeat for more sources')
+parser.add_argument('--channels', type=int, default=3, help='channels of synthetic data')
+parser.add_argument('--source', action='append', metavar='MODULE.CLASS', help='acquire from this source.Source instead of the LSM303, repeat for more sources')
+parser.add_argument('--decimate', type=int, default=1, metavar='N', help='keep every Nth sample, low pass filtered, of all channels')
+parser.add_argument('--merge-rate', type=float, metavar='HZ', help='common rate of several sources, the highest of theirs by default')
+parser.add_argument('--waves', default='sine', help=f"comma separated synthetic waveforms, cycled over the channels: {', '.join(synth.WAVES)}")
+parser.add_argument('--fft', type=int, default=1024, metavar='N', help='samples per spectrum frame, frames overlap by half')
+parser.add_argument('--measure', default='1,10', metavar='SECONDS', help="comma separated windows for the measurements besides the screen, 'm' cycles through them")
+parser.add_argument('--history', type=int, metavar='SAMPLES', help="samples kept for looking back at when stopped, as many as fit into 64 MB by default, 's' or a tap on the scope stops and runs")
+parser.add_argument('--history-file', metavar='FILE', help='keep the history in this file instead of a temporary one')
+parser.add_argument('--serve', metavar='TARGET', help='stream the samples to viewer.py on [HOST:]PORT or unix:PATH')
+parser.add_argument('--frames', type=int, help='quit after this many frames')
+parser.add_argument('--stats', metavar='FILE', help='write a JSON summary of the run on exit')
+parser.add_argument('--metrics', metavar='TARGET', help='export per stage metrics every second to FILE.csv, unix:SOCKET or a JSON lines FILE')
+parser.add_argument('--overlay', action='store_true', help="start with the metrics overlay shown, 'i' toggles it")
+parser.add_argument('--timing', action='store_true', help='print where the time went until the first frame')
+args = parser.parse_args()
+
+cache = startup.Cache()
+
+data = None
+ctrl = None
+rings = []
+ctrls = []
+procs = []
+server = None
+screen = None
+spec = None
+hist = None
+meter = None
 mouse_device = None
-try:
-    import evdev
-
-    for dev in [evdev.InputDevice(nam) for nam in evdev.list_devices()]:
-        if 'ByQDtech' in dev.name:
-            # that's what you get from buying a cheap display
-            pygame.mouse.set_visible(False)
-            mouse_position = lambda e: (dev.absinfo(0).value, dev.absinfo(1).value)
-            mouse_device = dev
-            break
-        dev.close()
-except:
-    pass
-
 try:
     run = mp.Value('b', True)
-    data = mp.Queue(0)
-    ctrl = mp.Queue(0)
-
-    proc = mp.Process(target=data_source, args=(data, ctrl, run))
-    proc.start()
-
+    if args.play:
+        srcs = [capture.Playback(args.play, args.speed)]
+    else:
+        waves = args.waves.split(',')
+        srcs = [synth.Synth(rate, args.channels, waves, seed=i) for i, rate in enumerate(args.synth or [])]
+        srcs += [source.load(name) for name in args.source or []]
+        if not srcs:
+            srcs = [lsm303.Accel()]
+    # every source acquires in a process and ring of its own
+    for s in srcs:
+        rings.append(ring.Ring(1 << 16, s.channels, dtype=s.dtype))
+        ctrls.append(control.Control([c[0] for c in s.controls] + ['r']))
+    if len(srcs) == 1:
+        src, data, ctrl = srcs[0], rings[0], ctrls[0]
+    else:
+        # and one more puts them all on a common timeline
+        src = merge.Merged(srcs, rings, args.merge_rate)
+        data = ring.Ring(1 << 16, src.channels, dtype=src.dtype)
+        ctrl = control.Group(list(ctrls))
+    channels = src.channels
+    # the filters run in whichever process writes what the scope shows
+    fctl = control.Control([f"F{c}" for c in range(channels)])
+    ctrls.append(fctl)
+    filtered = filters.Filtered(data, fctl, args.decimate)
+    for s, r, c in zip(srcs, rings, ctrls):
+        procs.append(mp.Process(target=s.run, args=(filtered if r is data else r, c, run)))
+    if src not in srcs:
+        procs.append(mp.Process(target=src.run, args=(filtered, None, run)))
+    for p in procs:
+        p.start()
+    if args.serve:
+        import stream
+        server = mp.Process(target=stream.serve, args=(data, run, args.serve))
+        server.start()
+    # not before, forking with the scan's thread half way through opening
+    # a device could leave a child stuck on a lock it holds
+    touch_scan = startup.TouchScan(cache.get('touch'))
+    if args.record:
+        ctrl.put('r', args.record)
+    timing.mark('source')
+
+    import compositor
+    import graph
+    import history
+    import measure
+    import metrics
+    import pygame
+    import pyramid
+    import scheduler
+    import spectrum
+    import textcache
+    import trigger
+    import widget
+    timing.mark('pygame')
+
+    screen, screen_size = setup_pygame((1024, 600), cache)
+    timing.mark('display')
+    scope = graph.Scope(min(1024, screen_size[0]), min(470, screen_size[1]))
+    scope.clear(screen)
+    pygame.display.flip()
+    timing.mark('first pixel')
 
     font = pygame.font.Font(None, 30)
-    title = font.render('Bibi rocks!', True, (255, 255, 255))
+    title = textcache.display_format(font.render('Bibi rocks!', True, (255, 255, 255)), True)
     title_pos = (15, 0)
-    fps = font.render('fps:  0.00', True, (100, 100, 100))
-    fps_pos = (scope.size[0] - fps.get_width() - 15, 0)
-    status = font.render('pos:', True, (200, 200, 200))
-    #status_pos = (15, screen_size[1] - 1 - status.get_height())
-    status_pos = (15, 600 - 1 - status.get_height())
-
-    btn_x = 155
+    info_pos = (title_pos[0] + title.get_width() + 20, 0)
+    # the counters change every frame, they are put together from glyphs
+    hud = textcache.Hud(font)
+    fps = ('fps:  0.00', (100, 100, 100))
+    fps_pos = (scope.size[0] - hud.size(fps[0])[0] - 15, 0)
+    #status_pos = (15, screen_size[1] - 1 - font.get_height())
+    status_pos = (15, 600 - 1 - font.get_height())
+    status_rect = pygame.Rect(0, status_pos[1], screen_size[0], font.get_height())
+
+    btn_x = 132
     btn_y = 30
     btn_size = (btn_x, btn_y)
     btn_offs = scope.rect().bottom
     widgets = []
-    widgets.append(widget.Setting('Zoom', lambda s: scope.set_step(s.index + 1), '1', [f"{i+1}" for i in range(100)], (0, 0), btn_offs, btn_size))
-    widgets.append(widget.Combobox('NORMAL', ['NORMAL', 'HIRES', 'LOWPO'], lambda s: ctrl.put(('m', s.index)), widget.btn_pos(btn_offs, 0, 3, btn_size), btn_size))
-    widgets.append(widget.Setting('Freq', lambda s: ctrl.put(('f', s.index)), '1620Hz', ['1Hz', '10Hz', '25Hz', '50Hz', '100Hz', '200Hz', '400Hz', '1344Hz', '1620Hz'], (0, 4), btn_offs, btn_size))
-    widgets.append(widget.Setting('Rnge', lambda s: ctrl.put(('a', s.index)), '16G', ['2G', '4G', '8G', '16G'], (0, 5), btn_offs, btn_size))
-    #widgets[1].enable(False)
+    # below 1 pixel per sample the trace turns into a min/max envelope
+    zoom_out = [2 ** (i + 1) for i in range(12)][::-1]
+    zoom_steps = [1 / d for d in zoom_out] + [i + 1 for i in range(100)]
+    # stopped, the screen shows the history up to hist_end
+    stopped = False
+    hist_end = 0
+    def set_zoom(s):
+        # zooming through history keeps the middle of the screen where it is
+        global hist_end
+        middle = hist_end - int(scope.span()) // 2
+        scope.set_step(zoom_steps[s.index])
+        hist_end = middle + int(scope.span()) // 2
+    widgets.append(widget.Setting('Zoom', set_zoom, '1', [f"1/{d}" for d in zoom_out] + [f"{i+1}" for i in range(100)], (0, 0), btn_offs, btn_size))
     zoom = widgets[0]
 
-    pygame.display.update()
+    # whatever the source has to offer, a combobox goes in the free slot of
+    # column 3, settings from column 4 on
+    combo_pos = [(0, 3)]
+    setting_col = 4
+    # by command, so what the source acknowledges can be shown
+    ctrl_widgets = {}
+    for cmd, label, values, current in src.controls:
+        notify = lambda s, cmd=cmd: ctrl.put(cmd, s.index)
+        if label is None and combo_pos:
+            ctrl_widgets[cmd] = widget.Combobox(current, values, notify, widget.btn_pos(btn_offs, *combo_pos.pop(0), btn_size), btn_size)
+        elif label is not None and setting_col < 6:
+            ctrl_widgets[cmd] = widget.Setting(label, notify, current, values, (0, setting_col), btn_offs, btn_size)
+            setting_col = setting_col + 1
+        else:
+            print(f"No room for control {cmd}")
+    widgets.extend(ctrl_widgets.values())
+
+    trig = trigger.Trigger()
+    def trig_mode(b):
+        if trig.mode == trig.SINGLE and trig.stopped:
+            trig.arm()
+        else:
+            trig.set_mode((trig.mode + 1) % len(trig.modes))
+        b.set_text(trig.modes[trig.mode])
+    names = src.channel_names()
+    def trig_channel(b):
+        trig.set_channel((trig.channel + 1) % channels)
+        b.set_text(f"Ch {names[trig.channel]}")
+        filt.set_index(filt_sel[trig.channel])
+    def trig_slope(b):
+        trig.set_slope(1 - trig.slope)
+        b.set_text(trig.slopes[trig.slope])
+    widgets.append(widget.Setting('Trig', lambda s: trig.set_level(int(s.settings[s.index])), '0', [f"{v}" for v in range(-50, 55, 5)], (0, 1), btn_offs, btn_size))
+    widgets.append(widget.PushButton(trig.modes[trig.mode], trig_mode, widget.btn_pos(btn_offs, 0, 2, btn_size), btn_size))
+    widgets.append(widget.PushButton(f"Ch {names[trig.channel]}", trig_channel, widget.btn_pos(btn_offs, 1, 2, btn_size), btn_size))
+    widgets.append(widget.PushButton(trig.slopes[trig.slope], trig_slope, widget.btn_pos(btn_offs, 2, 2, btn_size), btn_size))
+
+    # the filters of the trigger channel, as far as the acquisition side
+    # acknowledged them
+    filt_sel = [0] * channels
+    filt = widget.Setting('Filt', lambda s: fctl.put(f"F{trig.channel}", s.index), filters.names()[0], filters.names(), (0, 6), btn_offs, btn_size)
+    widgets.append(filt)
+
+    # time trace, with persistence or spectrum, linear or log frequency
+    views = ['TIME', 'PERSIST', 'FFT', 'LOG FFT']
+    TIME, PERSIST, FFT, LOG_FFT = range(len(views))
+    view = TIME
+    spec = spectrum.Spectrum(data, args.fft)
+    phos = graph.Phosphor(scope)
+    def view_next(b):
+        global view
+        view = (view + 1) % len(views)
+        if view >= FFT:
+            spec.start()
+        else:
+            spec.stop()
+        phos.clear()
+        b.set_text(views[view])
+    widgets.append(widget.PushButton(views[view], view_next, widget.btn_pos(btn_offs, 1, 3, btn_size), btn_size))
+
+    recording = args.record
+    def rec_toggle(b):
+        global recording
+        if recording:
+            recording = None
+        else:
+            recording = os.path.join(args.capture_dir, time.strftime('capture-%Y%m%d-%H%M%S.pysc'))
+        ctrl.put('r', recording)
+        b.set_text('* REC *' if recording else 'REC')
+    rec_button = widget.PushButton('* REC *' if recording else 'REC', rec_toggle, widget.btn_pos(btn_offs, 2, 3, btn_size), btn_size)
+    widgets.append(rec_button)
+
+    def show_acked(acks):
+        # the labels show what the source settled on, not what was asked for
+        global recording
+        for cmd, value in acks.items():
+            if cmd in ctrl_widgets and value != ctrl_widgets[cmd].index:
+                ctrl_widgets[cmd].set_index(value)
+            elif cmd in fctl.cmds:
+                filt_sel[fctl.cmds.index(cmd)] = value
+                if fctl.cmds.index(cmd) == trig.channel and value != filt.index:
+                    filt.set_index(value)
+        if acks.get('r') == 0 and recording:
+            recording = None
+            rec_button.set_text('REC')
+
+    timing.mark('widgets')
+
+    mouse_position = lambda event: event.pos
+    mouse_device = None
+    dev = touch_scan.result()
+    if dev:
+        # that's what you get from buying a cheap display
+        pygame.mouse.set_visible(False)
+        mouse_device = touch.Touch(dev)
+        mouse_position = mouse_device.position
+        cache.set('touch', dev.path)
+    cache.save()
+    timing.mark('touch')
+
+    comp = None
+    if not args.flip:
+        comp = compositor.Compositor(screen)
+        for w in widgets:
+            comp.add(w)
 
-    sample_cnt = (scope.xlim[1] - scope.xlim[0])
-    samples = [(0,0,0)] * sample_cnt
+    pygame.display.update()
 
+    sample_cnt = scope.columns()
+    envelope = pyramid.Pyramid(len(zoom_out), sample_cnt, channels)
+    scope.set_channels(channels)
+
+    # min/max/mean/RMS/frequency in the status line, over the screen or the
+    # last few seconds
+    meas = measure.Measure(channels)
+    hist = history.History(args.history or history.fitting(64 << 20, channels, src.dtype), channels, src.dtype, sample_cnt, args.history_file)
+    meas_windows = [None] + [float(v) for v in args.measure.split(',') if v]
+    meas_window = 0
+    meas_next = 0
+    status = ''
+    status_dirty = False
+    # (window, stats) of the last measurements while stopped
+    stopped_stats = (None, None)
+
+    def sample_rate():
+        # of what's in data, the source's if it knows, what the stamps say
+        # if not
+        if src.rate:
+            return src.rate / args.decimate
+        return spec.rate()
+
+    def losses():
+        # everything lost outside the rings, over the sources' and the
+        # merged one
+        out = {}
+        for r in rings + ([data] if data not in rings else []):
+            for name, count in r.losses().items():
+                out[name] = out.get(name, 0) + count
+        return out
+
+    def measurements():
+        ch = trig.channel
+        rate = sample_rate()
+        seconds = meas_windows[meas_window]
+        if seconds is None:
+            n = int(scope.span())
+            label = 'screen'
+        elif rate:
+            n = int(seconds * rate)
+            label = f"{seconds:g}s"
+        else:
+            return f"{names[ch]} {seconds:g}s: no sample rate yet"
+        if stopped:
+            # what's shown, or the window up to the right edge of it, out of
+            # the history's index and sums, again only once that moved
+            global stopped_stats
+            start = max(hist.oldest(), hist_end - n)
+            if stopped_stats[0] != (start, hist_end, rate, ch):
+                st = hist.stats(start, hist_end - start)
+                if st is not None:
+                    # like Measure only keeps so many crossings, the
+                    # frequency is that of the end of the window
+                    tail = max(start, hist_end - (1 << 14))
+                    st['freq'] = np.full(channels, np.nan)
+                    st['freq'][ch] = measure.frequency(hist.at(tail, hist_end - tail)[:, ch:ch + 1], st['mean'][ch:ch + 1], st['pp'][ch:ch + 1] * .1, rate)[0]
+                stopped_stats = ((start, hist_end, rate, ch), st)
+            st = stopped_stats[1]
+        else:
+            st = meas.stats(n, rate)
+        if st is None:
+            return ''
+        f = st['freq'][ch]
+        freq = '-' if np.isnan(f) else f"{f:.4g}Hz" if rate else f"{f:.3g}/sample"
+        return f"{names[ch]} {label}  min {st['min'][ch]:.3g}  max {st['max'][ch]:.3g}  p-p {st['pp'][ch]:.3g}  mean {st['mean'][ch]:.3g}  rms {st['rms'][ch]:.3g}  f {freq}"
+
+    def drain():
+        block = data.read()
+        envelope.add(block)
+        meas.add(block)
+        hist.add(block)
+        trig.scan(block, data.consumed() - len(block))
+        if view >= FFT:
+            spec.kick()
+
+    # a stats run wants every latency, not just the recent ones
+    sched = scheduler.Scheduler(args.fps, drain, history=None if args.stats else 100)
+    shown = data.written()
+    started = (time.monotonic(), shown)
+
+    # all instrumentation hangs off meter, None costs nothing
+    meter = None
+    overlay = args.overlay
+    if args.metrics or overlay:
+        meter = metrics.Metrics(metrics.sink(args.metrics) if args.metrics else None)
+
+    def draw_overlay():
+        y = fps_pos[1] + font.get_linesize()
+        for line in ['     stage    mean     p99     max'] + meter.lines():
+            hud.draw(screen, (scope.size[0] - 15 - hud.size(line)[0], y), line, (0, 200, 255))
+            y = y + font.get_linesize()
+
+    def track(event):
+        # motion only goes to the widgets in the middle of something, i.e.
+        # an open combobox
+        focus = None
+        for w in widgets:
+            if w.is_tracking() and w.track(mouse_position(event)):
+                focus = w
+        return focus
+
+    def stop_run():
+        global stopped, hist_end
+        stopped = not stopped
+        hist_end = hist.written()
+
+    # on the scope, a tap stops and runs, dragging pans through the history
+    # sideways and zooms up and down
+    drag = None
+    drag_zoom = 40
+
+    def drag_to(pos):
+        global hist_end
+        if drag is None:
+            return
+        last, dy = drag[1], drag[2]
+        drag[1] = pos
+        if not stopped:
+            return
+        hist_end = hist_end - int((pos[0] - last[0]) / scope.step)
+        dy = dy + pos[1] - last[1]
+        while dy <= -drag_zoom:
+            zoom.setting_next()
+            dy = dy + drag_zoom
+        while dy >= drag_zoom:
+            zoom.setting_prev()
+            dy = dy - drag_zoom
+        drag[2] = dy
+
+    starting = True
     update_cnt = 0
     begin = time.perf_counter_ns()
     while run.value:
+        sched.wait()
+        if meter:
+            meter.begin()
         focus_widget = None
+        motion = None
         for event in pygame.event.get():
             if event.type == pygame.KEYDOWN:
                 if event.key == ord('q'):
                     run.value = False
                 if event.key == ord('0'):
                     zoom.setting_reset()
+                if event.key == ord('d'):
+                    phos.set_decay(phos.decays[(phos.decays.index(phos.decay) + 1) % len(phos.decays)])
+                if event.key == ord('p'):
+                    spec.set_peak_hold(not spec.peak_hold)
+                if event.key == ord('a'):
+                    spec.set_average(spec.averages[(spec.averages.index(spec.average) + 1) % len(spec.averages)])
+                if event.key == ord('s'):
+                    stop_run()
+                if event.key == ord('m'):
+                    meas_window = (meas_window + 1) % len(meas_windows)
+                    meas_next = 0
+                if event.key == ord('i'):
+                    overlay = not overlay
+                    if overlay and meter is None:
+                        meter = metrics.Metrics()
+                    elif not overlay and not args.metrics:
+                        meter = None
                 continue
 
+            if event.type == pygame.MOUSEMOTION:
+                # only where a drag ends up by the end of the frame matters
+                motion = event
+                continue
+
+            if motion and event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+                # moves before a press or release still happened first
+                focus_widget = track(motion) or focus_widget
+                drag_to(mouse_position(motion))
+                motion = None
+
             if event.type == pygame.MOUSEBUTTONDOWN:
+                pos = mouse_position(event)
+                pressed = None
                 for widget in widgets:
-                    if widget.press(mouse_position(event)):
-                        focus_widget = widget
+                    if widget.press(pos):
+                        pressed = widget
+                focus_widget = pressed or focus_widget
+                # not the presses pygame makes of wheel notches, 4 and 5
+                if pressed is None and event.button == 1 and scope.rect().collidepoint(pos):
+                    # where it started, where it is and vertical travel not
+                    # yet turned into zoom steps
+                    drag = [pos, pos, 0]
                 continue
 
             if event.type == pygame.MOUSEBUTTONUP:
+                pos = mouse_position(event)
                 for widget in widgets:
-                    if widget.depress(mouse_position(event)):
+                    if widget.depress(pos):
                         focus_widget = widget
+                if drag and event.button == 1:
+                    drag_to(pos)
+                    if abs(pos[0] - drag[0][0]) + abs(pos[1] - drag[0][1]) < 10:
+                        stop_run()
+                    drag = None
                 continue
 
-            if event.type == pygame.MOUSEMOTION:
-                for widget in widgets:
-                    if widget.track(mouse_position(event)):
-                        focus_widget = widget
+            if event.type == pygame.MOUSEWHEEL and stopped:
+                for i in range(abs(event.y)):
+                    zoom.setting_next() if event.y > 0 else zoom.setting_prev()
+                continue
+
+            if event.type == pygame.MULTIGESTURE and stopped and abs(event.pinched) > .01:
+                zoom.setting_next() if event.pinched > 0 else zoom.setting_prev()
                 continue
 
             if event.type == pygame.QUIT:
                 run.value = False
-
-        try:
-            while True:
-                samples.append(data.get_nowait())
-        except queue.Empty:
-            pass
-
-        screen.fill((0, 0, 0))
-
-        count = len(samples) - sample_cnt
-        batch = font.render(f"batch: {count}", True, (157, 157, 157))
-        if count > 0:
-            samples = samples[-sample_cnt:]
-            scope.draw(screen, samples)
+        if motion:
+            focus_widget = track(motion) or focus_widget
+            drag_to(mouse_position(motion))
+
+        for c in (ctrl, fctl):
+            acks = c.acked()
+            if acks:
+                show_acked(acks)
+
+        if meter:
+            meter.lap('events')
+            meter.ring(data)
+        drain()
+        if meter:
+            meter.lap('drain')
+        stamp = data.last_stamp()
+        count = data.written() - shown
+        shown = shown + count
+
+        if comp is None:
+            screen.fill((0, 0, 0))
+
+        lat, lat_max = sched.latency_ms()
+        batch = f"batch: {count} lat: {lat:4.1f}/{lat_max:4.1f}ms skip: {sched.skipped}"
+        info = None
+        if stopped:
+            # acquisition carries on into the history, the screen stays put
+            # unless it's panned or the start of the screen is overwritten,
+            # a screen wider than the history shows what there is of it
+            span = min(int(scope.span()), hist.written() - hist.oldest())
+            hist_end = min(max(hist_end, hist.oldest() + span), hist.written())
+            start = hist_end - span
+            if scope.decimation() > 1:
+                cols = min(scope.columns(), span // scope.decimation())
+                if cols > 0:
+                    scope.draw_envelope(screen, *hist.envelope(start, hist_end - start, cols))
+                else:
+                    scope.clear(screen)
+            else:
+                scope.draw(screen, hist.at(start, hist_end - start))
+            rate = sample_rate()
+            back = hist_end - hist.written()
+            info = f"STOP {back / rate:+.2f}s" if rate else f"STOP {back:+d}"
+            screen.blit(title, title_pos)
+        elif count > 0:
+            if view >= FFT:
+                res = spec.result
+                if res is None:
+                    scope.clear(screen)
+                else:
+                    db, peak, rate = res
+                    scope.draw_spectrum(screen, db, peak, view == LOG_FFT)
+                    if rate:
+                        info = f"0-{rate / 2:.0f}Hz avg: {spec.average}{' peak' if peak is not None else ''}"
+            elif view == PERSIST:
+                if scope.decimation() > 1:
+                    phos.add_envelope(*envelope.latest(scope.decimation(), sample_cnt))
+                elif trig.mode == trig.ROLL:
+                    phos.add(data.latest(sample_cnt))
+                else:
+                    # every trigger since the last frame, not just the one on show
+                    windows = trig.windows(data, scope.span())
+                    if windows:
+                        phos.add(np.stack(windows))
+                scope.clear(screen)
+                # a SINGLE shot stays like it does on the trace
+                phos.draw(screen, trig.stopped)
+                if trig.mode != trig.ROLL and scope.decimation() == 1:
+                    scope.draw_trigger(screen, trig.position, trig.level, trig.channel)
+                info = f"decay: {phos.decay}"
+            elif scope.decimation() > 1:
+                scope.draw_envelope(screen, *envelope.latest(scope.decimation(), sample_cnt))
+            elif trig.mode == trig.ROLL:
+                scope.draw(screen, data.latest(sample_cnt))
+            else:
+                frame = trig.frame(data, scope.span())
+                if frame is None:
+                    scope.clear(screen)
+                else:
+                    scope.draw(screen, frame)
+                scope.draw_trigger(screen, trig.position, trig.level, trig.channel)
             screen.blit(title, title_pos)
+        if meter:
+            meter.lap('scope')
+
+        now = time.monotonic()
+        if now >= meas_next:
+            # a few times a second, any faster and it can't be read
+            meas_next = now + .25
+            text = measurements()
+            if text != status:
+                status = text
+                status_dirty = True
 
         if update_cnt == 10:
             end = time.perf_counter_ns()
-            fps = font.render(f"fps: {1e10/(end - begin):5.2f}", True, (250, 250, 0))
+            fps = (f"fps: {1e10/(end - begin):5.2f}", (250, 250, 0))
             update_cnt = 0
             begin = end
         else:
             update_cnt = update_cnt + 1
 
-        screen.blit(batch, (scope.x0, 0))
-        screen.blit(fps, fps_pos)
-        screen.blit(status, status_pos)
-
-        for widget in widgets:
-            if widget != focus_widget:
-                widget.draw(screen)
-        if focus_widget:
-            focus_widget.draw(screen)
-
-        pygame.display.flip()
-        time.sleep(.001)
+        if comp:
+            # the scope is the only thing changing all the time, the HUD
+            # lives on top of it
+            if count > 0 or stopped:
+                hud.draw(screen, (scope.x0, 0), batch, (157, 157, 157))
+                if info:
+                    hud.draw(screen, info_pos, info, (157, 157, 157))
+                hud.draw(screen, fps_pos, *fps)
+                if overlay:
+                    draw_overlay()
+                comp.damage(scope.rect())
+            full = comp.full
+            comp.draw_widgets(focus_widget)
+            if status_dirty or full:
+                # a full redraw clears it as well
+                screen.fill((0, 0, 0), status_rect)
+                hud.draw(screen, status_pos, status, (200, 200, 200))
+                comp.damage(status_rect)
+                status_dirty = False
+            if meter:
+                meter.lap('widgets')
+            comp.update()
+        else:
+            hud.draw(screen, (scope.x0, 0), batch, (157, 157, 157))
+            if info:
+                hud.draw(screen, info_pos, info, (157, 157, 157))
+            hud.draw(screen, fps_pos, *fps)
+            if overlay:
+                draw_overlay()
+            hud.draw(screen, status_pos, status, (200, 200, 200))
+
+            for widget in widgets:
+                if widget != focus_widget:
+                    widget.draw(screen)
+            if focus_widget:
+                focus_widget.draw(screen)
+            if meter:
+                meter.lap('widgets')
+
+            pygame.display.flip()
+        if meter:
+            meter.lap('display')
+            meter.tick(frames=sched.frames, skipped=sched.skipped, **losses())
+
+        if count > 0 and starting:
+            starting = False
+            timing.mark('first frame')
+            if args.timing:
+                timing.report()
+
+        if count > 0 and stamp:
+            sched.presented(stamp[1])
+
+        if args.frames and sched.frames >= args.frames:
+            run.value = False
+
+    if args.stats:
+        elapsed = time.monotonic() - started[0]
+        samples = shown - started[1]
+        lat = np.array(sched.latency, np.float64) / 1e6
+        pct = np.percentile(lat, [50, 90, 99, 100]) if len(lat) else [0, 0, 0, 0]
+        with open(args.stats, 'w') as f:
+            json.dump({
+                'frames': sched.frames,
+                'skipped': sched.skipped,
+                'seconds': elapsed,
+                'fps': sched.frames / elapsed,
+                'samples': samples,
+                'samples_per_s': samples / elapsed,
+                'overruns': data.overruns(),
+                **losses(),
+                'latency_ms': dict(zip(['p50', 'p90', 'p99', 'max'], [float(v) for v in pct])),
+                'startup_ms': timing.breakdown(),
+                }, f)
 finally:
+    if spec:
+        spec.stop()
+    if meter:
+        meter.close()
+    if hist:
+        hist.close()
     if mouse_device:
         mouse_device.close()
     run.value = False
-    pygame.quit()
-    proc.join()
+    if screen is not None:
+        pygame.quit()
+    for p in procs:
+        p.join()
+    if server:
+        server.join()
+    if data and data not in rings:
+        data.close()
+    for r in rings:
+        r.close()
+    for c in ctrls:
+        c.close()
 
 if False:
     print('scope:')
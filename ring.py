@@ -0,0 +1,157 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+def mirror_write(buf, pos, block):
+    # buf holds capacity = len(buf) // 2 entries twice, at i and i + capacity,
+    # block goes to position pos (counted since the beginning of time)
+    capacity = len(buf) // 2
+    if len(block) > capacity:
+        pos = pos + len(block) - capacity
+        block = block[-capacity:]
+    k = len(block)
+    i = pos % capacity
+    buf[i:i + k] = block
+    a = min(k, capacity - i)
+    buf[i + capacity:i + capacity + a] = block[:a]
+    buf[:k - a] = block[a:]
+
+class Ring (object):
+    # Single producer/single consumer sample ring living in shared memory.
+    #
+    # Every sample is stored twice, at i and i + capacity, so any window of up
+    # to capacity samples is one contiguous slice and read()/latest() can hand
+    # out plain views into the shared buffer without copying.
+    # The cursors count samples since creation and each one is only ever
+    # advanced by its owner - WR by the producer, RD by the consumer - which
+    # is what makes the ring safe without a lock.
+    # Producers may tag a block with the monotonic acquisition time of its
+    # last sample, those stamps are kept in a smaller ring of their own.
+    # Samples lost outside the ring are counted in the header too, every
+    # count by the one process that loses them: FIFO overflows before the
+    # ring and blocks a recording couldn't keep up with by the producer,
+    # blocks stream clients didn't take in time by the stream server.
+
+    WR = 0
+    RD = 1
+    OVERRUN = 2
+    STAMPS = 3
+    OVERFLOWS = 4
+    REC_DROPPED = 5
+    SERVE_DROPPED = 6
+    HEADER = 7
+    LOSSES = {'overflows': OVERFLOWS, 'rec_dropped': REC_DROPPED, 'serve_dropped': SERVE_DROPPED}
+
+    def __init__(self, capacity, channels, name=None, dtype=np.float32):
+        self.capacity = capacity
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        hsize = self.HEADER * np.dtype(np.int64).itemsize
+        ssize = 2 * max(1, capacity // 8) * np.dtype(np.int64).itemsize
+        dsize = 2 * capacity * channels * self.dtype.itemsize
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=hsize + ssize + dsize)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.hdr = np.ndarray((self.HEADER,), np.int64, self.shm.buf, 0)
+        self.stamps = np.ndarray((ssize // 16, 2), np.int64, self.shm.buf, hsize)
+        # channel after channel in memory, indexed [sample, channel] like the
+        # blocks that go in and out
+        self.buf = np.ndarray((channels, 2 * capacity), self.dtype, self.shm.buf, hsize + ssize).T
+        if self.owner:
+            self.hdr[:] = 0
+            self.stamps[:] = 0
+            self.buf[:] = 0
+
+    def __reduce__(self):
+        # handing the ring to another process attaches to the same segment
+        return (self.__class__, (self.capacity, self.channels, self.shm.name, self.dtype))
+
+    def close(self):
+        if self.owner:
+            self.shm.unlink()
+        del self.hdr
+        del self.stamps
+        del self.buf
+        try:
+            self.shm.close()
+        except BufferError:
+            # somebody still holds a view, the mapping goes away with the process
+            pass
+
+    def written(self):
+        return int(self.hdr[self.WR])
+
+    def consumed(self):
+        return int(self.hdr[self.RD])
+
+    def depth(self):
+        return int(self.hdr[self.WR] - self.hdr[self.RD])
+
+    def overruns(self):
+        return int(self.hdr[self.OVERRUN])
+
+    def losses(self):
+        # {name: count} of what got lost outside the ring
+        return {name: int(self.hdr[i]) for name, i in self.LOSSES.items()}
+
+    def lose(self, name, count=1):
+        self.hdr[self.LOSSES[name]] += count
+
+    def stamp_count(self):
+        return int(self.hdr[self.STAMPS])
+
+    def stamps_since(self, count):
+        # the (sample index, ns) stamps written after the first count ones,
+        # as far as they are still around, oldest first
+        s = self.stamp_count()
+        n = min(s - count, len(self.stamps))
+        return self.stamps[np.arange(s - n, s) % len(self.stamps)]
+
+    def last_stamp(self):
+        # (sample index, monotonic ns) of the most recently stamped block
+        s = int(self.hdr[self.STAMPS])
+        if s == 0:
+            return None
+        idx, t = self.stamps[(s - 1) % len(self.stamps)]
+        return (int(idx), int(t))
+
+    def write(self, block, stamp=None):
+        block = np.asarray(block, self.dtype).reshape(-1, self.channels)
+        wr = int(self.hdr[self.WR])
+        n = len(block)
+        mirror_write(self.buf, wr, block)
+        if stamp is not None:
+            s = int(self.hdr[self.STAMPS])
+            self.stamps[s % len(self.stamps)] = (wr + n - 1, stamp)
+            self.hdr[self.STAMPS] = s + 1
+        # publish only after the data is in place
+        self.hdr[self.WR] = wr + n
+
+    def read(self):
+        # Returns a view of everything written since the last read. If the
+        # producer lapped the consumer the oldest samples are lost and
+        # accounted for in overruns().
+        # The view stays valid until the producer wraps around onto it.
+        wr = int(self.hdr[self.WR])
+        n = wr - int(self.hdr[self.RD])
+        if n > self.capacity:
+            self.hdr[self.OVERRUN] += n - self.capacity
+            n = self.capacity
+        self.hdr[self.RD] = wr
+        i = (wr - n) % self.capacity
+        return self.buf[i:i + n]
+
+    def at(self, start, count):
+        # view of the samples start .. start + count - 1, None if they are not
+        # all written yet or already overwritten
+        if start < self.written() - self.capacity or start + count > self.written():
+            return None
+        i = start % self.capacity
+        return self.buf[i:i + count]
+
+    def latest(self, count):
+        # view of the most recent count samples, independent of the read cursor
+        count = min(count, self.capacity)
+        i = (int(self.hdr[self.WR]) - count) % self.capacity
+        return self.buf[i:i + count]
@@ -0,0 +1,42 @@
+import collections
+import time
+
+class Scheduler (object):
+    # Paces the main loop to a target frame rate. The time between frames is
+    # spent draining the sample ring instead of being slept away, and frames
+    # that can't be made in time are dropped rather than queued up, so the
+    # display never falls behind the data.
+
+    def __init__(self, fps, drain=None, poll=.002, history=100):
+        self.period = int(1e9 / fps)
+        self.drain = drain
+        self.poll = poll
+        self.deadline = time.monotonic_ns()
+        self.frames = 0
+        self.skipped = 0
+        # sample acquisition to pixels on screen, in ns
+        self.latency = collections.deque(maxlen=history)
+
+    def wait(self):
+        now = time.monotonic_ns()
+        while now < self.deadline:
+            if self.drain:
+                self.drain()
+            time.sleep(min(self.poll, (self.deadline - now) / 1e9))
+            now = time.monotonic_ns()
+        missed = (now - self.deadline) // self.period
+        if missed:
+            # coalesce, whatever came in meanwhile goes into this frame
+            self.skipped += missed
+            self.deadline += missed * self.period
+        self.deadline += self.period
+        self.frames += 1
+
+    def presented(self, stamp):
+        # stamp is the acquisition time of the newest sample just put on screen
+        self.latency.append(time.monotonic_ns() - stamp)
+
+    def latency_ms(self):
+        if not self.latency:
+            return (0, 0)
+        return (sum(self.latency) / len(self.latency) / 1e6, max(self.latency) / 1e6)
@@ -0,0 +1,36 @@
+import importlib
+import numpy as np
+
+class Source (object):
+    # What the scope needs to know about an acquisition source. run() is the
+    # body of the acquisition process, it writes (N, channels) blocks of dtype
+    # into the ring until run goes False and handles the (cmd, index) tuples
+    # from ctrl.get(), one cmd per entry in controls, acknowledging what
+    # went into effect with ctrl.ack().
+    #
+    # controls are (cmd, label, values, current), a label makes it a +/-
+    # Setting, None a Combobox.
+
+    channels = 3
+    dtype = np.float32
+    # native sample rate in Hz, None if it's down to the controls
+    rate = None
+    names = None
+    controls = []
+
+    def channel_names(self):
+        if self.names:
+            return list(self.names)
+        return [f"{i}" for i in range(self.channels)]
+
+    def run(self, data, ctrl, run):
+        raise NotImplementedError
+
+def load(spec):
+    # 'module.Class' as given on the command line, constructed without
+    # arguments
+    module, _, name = spec.rpartition('.')
+    cls = getattr(importlib.import_module(module), name)
+    if not issubclass(cls, Source):
+        raise ValueError(f"{spec} is not a source")
+    return cls()
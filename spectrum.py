@@ -0,0 +1,115 @@
+import numpy as np
+import threading
+
+class Spectrum (object):
+    # Windowed, overlapping rfft of the stream, worked out in a thread of its
+    # own so the render loop only ever picks up the latest result. Frames of
+    # size samples, each starting hop samples after the previous one, are
+    # read straight out of the ring by position - the worker keeps its own
+    # place in the stream and never touches the ring's read cursor.
+    #
+    # result is (db, peak, rate): the averaged spectrum in dB as
+    # [channel, bin], the peak hold in the same shape or None and the
+    # sample rate according to the ring's stamps, None until it's known.
+
+    averages = [1, 2, 4, 8, 16, 32]
+
+    def __init__(self, data, size=1024, overlap=.5):
+        self.data = data
+        self.size = size
+        self.hop = max(1, int(size * (1 - overlap)))
+        self.window = np.hanning(size).astype(np.float32)
+        # a sine of amplitude a shows up as a
+        self.norm = 2 / self.window.sum()
+        self.average = 1
+        self.peak_hold = False
+        self.wake = threading.Event()
+        self.running = False
+        self.thread = None
+        self.frames = 0
+        self.reset()
+
+    def reset(self):
+        self.pos = None
+        self.avg = None
+        self.peak = None
+        self.result = None
+
+    def start(self):
+        if self.thread is None:
+            self.reset()
+            self.running = True
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.running = False
+            self.wake.set()
+            self.thread.join()
+            self.thread = None
+
+    def kick(self):
+        # new samples in the ring
+        self.wake.set()
+
+    def set_average(self, n):
+        self.average = n
+
+    def set_peak_hold(self, on):
+        self.peak_hold = on
+        self.peak = None
+
+    def rate(self):
+        count = self.data.stamp_count()
+        stamps = self.data.stamps_since(max(0, count - 32))
+        if len(stamps) < 2:
+            return None
+        di = stamps[-1, 0] - stamps[0, 0]
+        dt = stamps[-1, 1] - stamps[0, 1]
+        if di <= 0 or dt <= 0:
+            return None
+        return di * 1e9 / dt
+
+    def _frame(self):
+        # the next frame as [channel, sample] with the window applied, None
+        # if it isn't all there yet
+        limit = self.data.capacity // 2
+        written = self.data.written()
+        if self.pos is None or written - self.pos > limit:
+            # just started or fallen behind, carry on from the latest
+            self.pos = max(0, written - self.size)
+        view = self.data.at(self.pos, self.size)
+        if view is None:
+            return None
+        frame = view.T * self.window
+        if self.data.written() - self.pos > limit:
+            # the producer got there while it was being copied
+            return None
+        self.pos = self.pos + self.hop
+        return frame
+
+    def _run(self):
+        while self.running:
+            self.wake.clear()
+            frame = self._frame()
+            if frame is None:
+                self.wake.wait(.1)
+                continue
+            mag = np.abs(np.fft.rfft(frame)) * self.norm
+            if self.avg is None or self.avg.shape != mag.shape:
+                self.avg = mag
+            else:
+                # exponential, about the last average frames
+                self.avg += (mag - self.avg) / self.average
+            db = 20 * np.log10(self.avg + 1e-9)
+            peak = None
+            if self.peak_hold:
+                if self.peak is None or self.peak.shape != db.shape:
+                    self.peak = db.copy()
+                else:
+                    np.maximum(self.peak, db, out=self.peak)
+                peak = self.peak.copy()
+            self.frames += 1
+            # a single assignment, the render loop gets the old one or the new one
+            self.result = (db, peak, self.rate())
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+import time
+
+# Bits and pieces to get the first pixel on screen quickly. Whatever was
+# found by probing - the video driver that worked, the touch screen's device
+# node - is kept in a small JSON file and tried first next time round.
+
+TOUCH_NAME = 'ByQDtech'
+
+class Timing (object):
+    # time since the process started, marked at each step of the way
+
+    def __init__(self):
+        self.t0 = time.monotonic()
+        self.marks = []
+
+    def mark(self, name):
+        self.marks.append((name, time.monotonic() - self.t0))
+
+    def breakdown(self):
+        # {step: ms spent on it}, in order
+        out = {}
+        last = 0
+        for name, t in self.marks:
+            out[name] = round((t - last) * 1000, 1)
+            last = t
+        return out
+
+    def report(self):
+        last = 0
+        for name, t in self.marks:
+            print(f"{name:>12} {(t - last) * 1000:7.1f}ms {t * 1000:7.1f}ms")
+            last = t
+
+class Cache (object):
+
+    def __init__(self, path=None):
+        if path is None:
+            base = os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+            path = os.path.join(base, 'pyscope.json')
+        self.path = path
+        try:
+            with open(path) as f:
+                self.values = json.load(f)
+        except (OSError, ValueError):
+            self.values = {}
+        self.changed = False
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value):
+        if self.values.get(key) != value:
+            self.values[key] = value
+            self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w') as f:
+                json.dump(self.values, f)
+            self.changed = False
+        except OSError:
+            # read only somewhere, it's only a cache
+            pass
+
+class TouchScan (object):
+    # Looks for the touch screen in a thread while the display comes up.
+    # The device node from the last run is checked first, only if that's not
+    # it every input device gets opened.
+
+    def __init__(self, cached=None):
+        self.cached = cached
+        self.device = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _open(self, evdev, path):
+        try:
+            dev = evdev.InputDevice(path)
+        except OSError:
+            return None
+        if TOUCH_NAME in dev.name:
+            return dev
+        dev.close()
+        return None
+
+    def _run(self):
+        try:
+            import evdev
+        except ImportError:
+            return
+        if self.cached:
+            self.device = self._open(evdev, self.cached)
+        if self.device is None:
+            for path in evdev.list_devices():
+                if path != self.cached:
+                    self.device = self._open(evdev, path)
+                    if self.device:
+                        break
+
+    def result(self):
+        # the evdev.InputDevice or None, waits for the scan to finish
+        self.thread.join()
+        return self.device
@@ -0,0 +1,170 @@
+import asyncio
+import numpy as np
+import os
+import socket
+import struct
+
+# Stream framing, all little endian. Every frame is
+#   PREFIX      length of what follows the prefix, kind
+# followed by, depending on the kind
+#   HELLO       channels, sample dtype as in numpy ('<f4'), once on connect
+#   BLOCK       stream index of the first sample, sample count, monotonic
+#               ns of the most recent acquisition stamp, then
+#               count * channels samples [sample, channel]
+# Blocks a client didn't keep up with show up as gaps in the indices.
+
+PREFIX = struct.Struct('<IB')
+HELLO = struct.Struct('<H8s')
+BLOCK = struct.Struct('<qIq')
+
+KIND_HELLO = 0
+KIND_BLOCK = 1
+
+def frame(kind, *parts):
+    body = b''.join(parts)
+    return PREFIX.pack(len(body), kind) + body
+
+def address(target):
+    # 'unix:PATH' or '[HOST:]PORT', no host means every interface
+    if target.startswith('unix:'):
+        return (socket.AF_UNIX, target[5:])
+    host, _, port = target.rpartition(':')
+    return (socket.AF_INET, (host or None, int(port)))
+
+class Server (object):
+    # Publishes the ring to any number of subscribers from a process of its
+    # own. It follows the ring by position like Spectrum does, so neither the
+    # source nor the display ever wait for it. Every block is encoded once
+    # and queued to all the clients, a client whose queue is full loses its
+    # oldest block instead of holding anybody up. On the way out clients get
+    # a moment to send what's queued, one stuck on a reader that doesn't
+    # read is cut off.
+
+    def __init__(self, data, run, depth=64, interval=.01):
+        self.data = data
+        self.run = run
+        self.depth = depth
+        self.interval = interval
+        self.dtype = data.dtype.newbyteorder('<')
+        self.hello = frame(KIND_HELLO, HELLO.pack(data.channels, self.dtype.str.encode()))
+        self.clients = set()
+        # connection and task of every client, to cut them off
+        self.writers = {}
+
+    async def _client(self, reader, writer):
+        q = asyncio.Queue(self.depth)
+        self.clients.add(q)
+        self.writers[writer] = asyncio.current_task()
+        try:
+            writer.write(self.hello)
+            while True:
+                msg = await q.get()
+                if msg is None:
+                    break
+                writer.write(msg)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # gone, cut off, or shut down while still sending
+            pass
+        finally:
+            self.clients.discard(q)
+            self.writers.pop(writer, None)
+            writer.close()
+
+    def _publish(self, msg):
+        for q in self.clients:
+            if q.full():
+                q.get_nowait()
+                self.data.lose('serve_dropped')
+            q.put_nowait(msg)
+
+    async def _follow(self):
+        limit = self.data.capacity // 2
+        pos = self.data.written()
+        while self.run.value:
+            await asyncio.sleep(self.interval)
+            written = self.data.written()
+            if not self.clients or written - pos > limit:
+                # nobody listening or fallen behind, carry on from here
+                pos = written
+                continue
+            view = self.data.at(pos, written - pos)
+            if view is None or len(view) == 0:
+                continue
+            samples = np.ascontiguousarray(view, self.dtype).tobytes()
+            if self.data.written() - pos > limit:
+                # the producer got there while it was being copied
+                pos = self.data.written()
+                continue
+            stamp = self.data.last_stamp()
+            self._publish(frame(KIND_BLOCK, BLOCK.pack(pos, written - pos, stamp[1] if stamp else 0), samples))
+            pos = written
+
+    async def serve(self, target):
+        family, addr = address(target)
+        if family == socket.AF_UNIX:
+            if os.path.exists(addr):
+                # left over from a previous run
+                os.unlink(addr)
+            server = await asyncio.start_unix_server(self._client, addr)
+        else:
+            server = await asyncio.start_server(self._client, *addr)
+        try:
+            await self._follow()
+        finally:
+            # None tells the clients to hang up
+            self._publish(None)
+            server.close()
+            if self.writers:
+                await asyncio.wait(list(self.writers.values()), timeout=1)
+            for writer in list(self.writers):
+                writer.transport.abort()
+            await server.wait_closed()
+
+def serve(data, run, target):
+    # process target, publishes data on target until run goes False
+    asyncio.run(Server(data, run).serve(target))
+
+class Client (object):
+    # Blocking reader for viewers
+
+    def __init__(self, target):
+        family, addr = address(target)
+        if family == socket.AF_INET and addr[0] is None:
+            addr = ('localhost', addr[1])
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(addr)
+        self.f = self.sock.makefile('rb')
+        kind, body = self.next()
+        if kind != KIND_HELLO:
+            raise ValueError(f"{target} doesn't talk the stream protocol")
+        self.channels, dtype = HELLO.unpack(body)
+        self.dtype = np.dtype(dtype.rstrip(b'\0').decode())
+
+    def next(self):
+        # (kind, body) of the next frame, raises EOFError when the stream ends
+        head = self.f.read(PREFIX.size)
+        if len(head) < PREFIX.size:
+            raise EOFError
+        size, kind = PREFIX.unpack(head)
+        body = self.f.read(size)
+        if len(body) < size:
+            raise EOFError
+        return (kind, body)
+
+    def blocks(self):
+        # (samples, start, t) for every block until the stream ends
+        try:
+            while True:
+                kind, body = self.next()
+                if kind != KIND_BLOCK:
+                    continue
+                start, n, t = BLOCK.unpack_from(body)
+                samples = np.frombuffer(body, self.dtype, n * self.channels, BLOCK.size)
+                yield (samples.reshape(n, self.channels), start, t)
+        except EOFError:
+            return
+
+    def close(self):
+        self.f.close()
+        self.sock.close()
@@ -0,0 +1,119 @@
+import capture
+import lsm303
+import numpy as np
+import time
+from source import Source
+
+WAVES = ['sine', 'square', 'chirp', 'noise', 'impulse']
+
+# what the 'Rnge' and 'NORMAL'/'HIRES'/'LOWPO' controls do to synthetic data
+SCALE = [0.625, 1.25, 2.5, 5]
+NOISE = [1, 2, .5]
+
+class Generator (object):
+    # Synthetic signals a whole block at a time. Every channel gets one of
+    # WAVES, with the phases spread over the channels, all of them repeating
+    # every period samples, plus uniform noise. Signals continue seamlessly
+    # from one block to the next whatever the block sizes.
+
+    def __init__(self, channels, waves=('sine',), period=1920, seed=0):
+        self.channels = channels
+        self.waves = [waves[i % len(waves)] for i in range(channels)]
+        self.period = period
+        self.phase = 2 * np.pi * np.arange(channels) / channels
+        self.rng = np.random.default_rng(seed)
+        self.scale = SCALE[-1]
+        self.noise = NOISE[0]
+        self.n = 0
+
+    def block(self, count):
+        k = self.n + np.arange(count)
+        out = np.empty((count, self.channels))
+        for wave in set(self.waves):
+            cols = [i for i, w in enumerate(self.waves) if w == wave]
+            x = 2 * np.pi * k[:, None] / self.period + self.phase[cols]
+            if wave == 'sine':
+                out[:, cols] = np.sin(x)
+            elif wave == 'square':
+                out[:, cols] = np.sign(np.sin(x))
+            elif wave == 'chirp':
+                # from 1 to 16 periods per period samples, over 16 periods
+                sweep = 16 * self.period
+                t = (k % sweep)[:, None]
+                out[:, cols] = np.sin(2 * np.pi * (t + 15 * t * t / (2 * sweep)) / self.period + self.phase[cols])
+            elif wave == 'noise':
+                out[:, cols] = self.rng.standard_normal((count, len(cols))) / 3
+            elif wave == 'impulse':
+                shift = (self.phase[cols] * self.period / (2 * np.pi)).astype(np.int64)
+                out[:, cols] = (k[:, None] + shift) % self.period == 0
+        self.n = self.n + count
+        return 9 * self.scale * out + (self.rng.random((count, self.channels)) - .5) * self.noise * self.scale
+
+class Synth (Source):
+    controls = lsm303.CONTROLS
+
+    def __init__(self, rate=None, channels=3, waves=('sine',), seed=0):
+        self.rate = rate
+        self.channels = channels
+        self.waves = waves
+        self.seed = seed
+        if rate is not None:
+            # the rate is what it was told, Freq has nothing to say
+            self.controls = [c for c in lsm303.CONTROLS if c[0] != 'f']
+        if channels == len(lsm303.NAMES):
+            self.names = lsm303.NAMES
+
+    def run(self, data, ctrl, run):
+        source(data, ctrl, run, self.rate, self.channels, self.waves, self.seed)
+
+def source(data, ctrl, run, rate=None, channels=3, waves=('sine',), seed=0):
+    # Feeds the ring from a Generator like lsm303.Accel does from the sensor.
+    # Blocks of about 1ms are paced against the monotonic clock so the average
+    # rate stays exact however long the sleeps turn out. Without a rate it
+    # follows the 'Freq' setting, starting at 1620Hz.
+    gen = Generator(channels, waves, seed=seed)
+    settings = [len(lsm303.RATE_HZ) - 1, len(SCALE) - 1, 0]
+    fixed = rate is not None
+    if not fixed:
+        rate = lsm303.RATE_HZ[settings[0]]
+        ctrl.ack('f', settings[0])
+    ctrl.ack('a', settings[1])
+    ctrl.ack('m', settings[2])
+    rec = None
+    n = 0
+    start = time.monotonic()
+    while run.value:
+        block = max(1, int(rate // 1000))
+        delay = start + (n + block) / rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        samples = gen.block(block)
+        t = time.monotonic_ns()
+        if rec and not rec.put(samples, data.written(), t, rate, *settings[1:]):
+            data.lose('rec_dropped')
+        data.write(samples, t)
+        n = n + block
+        for cmd, val in ctrl.get():
+            if cmd == 'f':
+                if fixed:
+                    continue
+                rate = lsm303.RATE_HZ[val]
+                settings[0] = val
+                # the clock starts over at the new rate
+                n = 0
+                start = time.monotonic()
+            elif cmd == 'a':
+                gen.scale = SCALE[val]
+                settings[1] = val
+            elif cmd == 'm':
+                gen.noise = NOISE[val]
+                settings[2] = val
+            elif cmd == 'r':
+                rec = capture.record(rec, val, channels, [rate] + settings[1:])
+                val = 1 if rec else 0
+            else:
+                print(f"This sucks {cmd} : {val}")
+                continue
+            ctrl.ack(cmd, val)
+    if rec:
+        rec.close()
@@ -0,0 +1,90 @@
+import collections
+import pygame
+
+def display_format(surface, rle=False):
+    # A copy in the display's pixel format, blitting anything else converts
+    # every pixel on the way, which on a 16 bit framebuffer is most of the
+    # cost. Left alone while there's no display to convert to.
+    if pygame.display.get_surface() is None:
+        return surface
+    if surface.get_flags() & pygame.SRCALPHA:
+        surface = surface.convert_alpha()
+    else:
+        surface = surface.convert()
+    if rle:
+        if surface.get_flags() & pygame.SRCALPHA:
+            surface.set_alpha(255, pygame.RLEACCEL)
+        else:
+            # mostly background, black is see through
+            surface.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+    return surface
+
+class Cache (object):
+    # LRU cache for rendered surfaces. Keys are whatever identifies the
+    # result, e.g. (font, text, color) for plain text or the label, state and
+    # size for a whole button. Cached surfaces are shared, never draw on them.
+    # They are kept in the display's pixel format, so the display has to be
+    # set up before the first get().
+
+    def __init__(self, size=256, rle=False):
+        self.size = size
+        self.rle = rle
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, make):
+        surface = self.entries.get(key)
+        if surface is None:
+            self.misses += 1
+            surface = display_format(make(), self.rle)
+            self.entries[key] = surface
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return surface
+
+    def render(self, font, text, antialias, color):
+        return self.get((font, text, antialias, color), lambda: font.render(text, antialias, color))
+
+# shared by all widgets
+cache = Cache()
+
+class Hud (object):
+    # Text that changes every frame, like the fps and batch counters. Every
+    # character is rendered once per color and the string is put together
+    # from those glyphs into a line of its own, black being transparent and
+    # run length encoded. Lines are cached too, only text that changed gets
+    # put together again.
+
+    def __init__(self, font, antialias=True):
+        self.font = font
+        self.antialias = antialias
+        self.glyphs = {}
+        self.lines = Cache(64, rle=True)
+
+    def glyph(self, ch, color):
+        g = self.glyphs.get((ch, color))
+        if g is None:
+            g = self.font.render(ch, self.antialias, color)
+            self.glyphs[(ch, color)] = g
+        return g
+
+    def size(self, text):
+        return (sum(self.glyph(ch, (0, 0, 0)).get_width() for ch in text), self.font.get_height())
+
+    def _line(self, text, color):
+        x = 0
+        seq = []
+        for ch in text:
+            g = self.glyph(ch, color)
+            seq.append((g, (x, 0)))
+            x = x + g.get_width()
+        line = pygame.Surface((max(1, x), self.font.get_height()))
+        line.blits(seq, False)
+        return line
+
+    def draw(self, surface, pos, text, color):
+        return surface.blit(self.lines.get((text, color), lambda: self._line(text, color)), pos)
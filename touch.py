@@ -0,0 +1,38 @@
+import threading
+
+class Touch (object):
+    # Latest absolute position of the touch screen, kept up to date by a
+    # thread reading its evdev device so looking it up from the render loop
+    # doesn't cost any ioctls. pygame still delivers the events, only their
+    # position comes from here.
+
+    def __init__(self, dev):
+        from evdev import ecodes
+        self.dev = dev
+        self.pos = (dev.absinfo(ecodes.ABS_X).value, dev.absinfo(ecodes.ABS_Y).value)
+        self.reports = 0
+        self.thread = threading.Thread(target=self._run, args=(ecodes,), daemon=True)
+        self.thread.start()
+
+    def _run(self, ecodes):
+        x, y = self.pos
+        try:
+            for e in self.dev.read_loop():
+                if e.type == ecodes.EV_ABS:
+                    if e.code == ecodes.ABS_X:
+                        x = e.value
+                    elif e.code == ecodes.ABS_Y:
+                        y = e.value
+                elif e.type == ecodes.EV_SYN and e.code == ecodes.SYN_REPORT:
+                    # a complete report, x and y go out together
+                    self.pos = (x, y)
+                    self.reports += 1
+        except OSError:
+            # closed or unplugged
+            pass
+
+    def position(self, event=None):
+        return self.pos
+
+    def close(self):
+        self.dev.close()
@@ -0,0 +1,144 @@
+import collections
+import numpy as np
+import time
+
+class Trigger (object):
+    # Finds the trigger points in each block as it arrives and decides which
+    # window of the stream the scope should show.
+    #
+    # A trigger needs the signal to go below level - hysteresis first (arm)
+    # and then to reach level, which keeps noise around the level from
+    # triggering over and over. The search is done with cumulative maxima
+    # over the arm/fire masks, only the few hits per block are looked at one
+    # by one for the holdoff.
+
+    ROLL = 0
+    AUTO = 1
+    NORMAL = 2
+    SINGLE = 3
+    modes = ['ROLL', 'AUTO', 'NORM', 'SINGLE']
+
+    RISING = 0
+    FALLING = 1
+    slopes = ['RISE', 'FALL']
+
+    def __init__(self, channel=0, level=0, hysteresis=3, holdoff=0, position=.5, auto_timeout=.2):
+        self.mode = self.ROLL
+        self.slope = self.RISING
+        self.channel = channel
+        self.level = level
+        self.hysteresis = hysteresis
+        # samples after a trigger before the next one is accepted
+        self.holdoff = holdoff
+        # fraction of the screen before the trigger point
+        self.position = position
+        self.auto_timeout = auto_timeout
+        self.hits = collections.deque(maxlen=256)
+        self.arm()
+
+    def arm(self):
+        self.armed = False
+        self.stopped = False
+        self.last = None
+        self.shown = None
+        self.shown_at = time.monotonic()
+        self.held = None
+        self.collected = None
+        self.hits.clear()
+
+    def set_mode(self, mode):
+        self.mode = mode
+        self.arm()
+
+    def set_channel(self, channel):
+        self.channel = channel
+        self.arm()
+
+    def set_slope(self, slope):
+        self.slope = slope
+        self.arm()
+
+    def set_level(self, level):
+        self.level = level
+        self.arm()
+
+    def scan(self, block, start):
+        # block holds the samples start, start + 1, ... of the stream
+        if self.mode == self.ROLL or self.stopped or len(block) == 0:
+            return
+        v = block[:, self.channel]
+        level = self.level
+        if self.slope == self.FALLING:
+            v = -v
+            level = -level
+        above = v >= level
+        below = v < level - self.hysteresis
+
+        # -1 stands for whatever happened before this block
+        idx = np.arange(len(v))
+        last_below = np.maximum.accumulate(np.where(below, idx, -1 if self.armed else -2))
+        last_above = np.maximum.accumulate(np.where(above, idx, -2 if self.armed else -1))
+        prev_above = np.empty_like(last_above)
+        prev_above[0] = -2 if self.armed else -1
+        prev_above[1:] = last_above[:-1]
+        self.armed = bool(last_below[-1] > last_above[-1])
+
+        for i in idx[above & (last_below > prev_above)] + start:
+            if self.last is None or i - self.last >= self.holdoff:
+                self.hits.append(int(i))
+                self.last = i
+
+    def frame(self, ring, count):
+        # Returns the samples to show for a screen of count samples, None if
+        # there's nothing to show yet.
+        pre = int(count * self.position)
+        written = ring.written()
+        hit = None
+        for i in reversed(self.hits):
+            if i - pre + count <= written:
+                hit = i
+                break
+        now = time.monotonic()
+        if hit is not None and hit != self.shown:
+            view = ring.at(hit - pre, count)
+            if view is not None:
+                # the ring moves on, hang on to a copy until the next trigger
+                self.held = view.copy(order='K')
+                self.shown = hit
+                self.shown_at = now
+                if self.mode == self.SINGLE:
+                    self.stopped = True
+        elif self.mode == self.AUTO and now - self.shown_at > self.auto_timeout:
+            self.held = None
+            return ring.latest(count)
+        return self.held
+
+    def windows(self, ring, count, limit=64):
+        # Views of every complete window of count samples around the hits
+        # since the last call, the most recent limit of them, for the
+        # persistence display. They point into the ring, use them right away.
+        # SINGLE and AUTO go as for frame(), the first window stops SINGLE
+        # and AUTO rolls when nothing triggered for a while.
+        if self.stopped:
+            return []
+        pre = int(count * self.position)
+        written = ring.written()
+        out = []
+        for i in self.hits:
+            if self.collected is not None and i <= self.collected:
+                continue
+            if i - pre + count > written:
+                break
+            view = ring.at(i - pre, count)
+            if view is not None:
+                out.append(view)
+            self.collected = i
+        now = time.monotonic()
+        if out:
+            self.shown_at = now
+            if self.mode == self.SINGLE:
+                self.stopped = True
+                return out[:1]
+        elif self.mode == self.AUTO and now - self.shown_at > self.auto_timeout:
+            return [ring.latest(count)]
+        return out[-limit:]
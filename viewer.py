@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+
+# Watches a pyscope --serve stream from another machine, drawn by the same
+# graph.Scope. A thread reads the blocks into a local ring, the window just
+# shows the latest screenful at its own pace.
+
+import argparse
+import graph
+import pygame
+import ring
+import stream
+import textcache
+import threading
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('target', help="what pyscope --serve listens on, HOST:PORT or unix:PATH")
+parser.add_argument('--fps', type=float, default=30, help='frame rate')
+args = parser.parse_args()
+
+client = stream.Client(args.target)
+data = ring.Ring(1 << 16, client.channels, dtype=client.dtype)
+gaps = 0
+
+def receive():
+    # blocks the server dropped for us are just left out
+    global gaps
+    expected = None
+    for samples, start, t in client.blocks():
+        if expected is not None and start != expected:
+            gaps += 1
+        expected = start + len(samples)
+        data.write(samples, t)
+
+reader = threading.Thread(target=receive, daemon=True)
+reader.start()
+
+pygame.display.init()
+pygame.font.init()
+screen = pygame.display.set_mode((1024, 470))
+pygame.display.set_caption(f"pyscope {args.target}")
+scope = graph.Scope(1024, 470)
+hud = textcache.Hud(pygame.font.Font(None, 30))
+
+try:
+    running = True
+    shown = 0
+    while running and reader.is_alive():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == ord('q')):
+                running = False
+        if data.written() != shown:
+            shown = data.written()
+            scope.draw(screen, data.latest(scope.columns()))
+            hud.draw(screen, (15, 0), f"{client.channels} channels  gaps: {gaps}", (157, 157, 157))
+            pygame.display.flip()
+        time.sleep(1 / args.fps)
+finally:
+    client.close()
+    pygame.quit()
+    data.close()
@@ -1,4 +1,5 @@
 import pygame
+from textcache import cache
 
 def btn_pos(offs, row, col, size):
     x = 15 + col * (size[0] + 12)
@@ -14,9 +15,25 @@ class Text (object):
             self.__class__.font = pygame.font.SysFont('notomono', 20)
         self.color = (0, 0, 0)
         self.label = label
+        self.dirty = True
+
+    def _render(self, label, color):
+        return cache.render(self.font, label, True, color)
 
     def _redraw(self):
-        self.text = self.font.render(self.label, True, self.color)
+        self.text = self._render(self.label, self.color)
+        self.dirty = True
+
+    def is_dirty(self):
+        return self.dirty
+
+    def is_tracking(self):
+        # whether track() has anything to do, i.e. it wants to see motion
+        return False
+
+    def area(self):
+        # what needs to be cleared and redrawn when the widget is dirty
+        return self.rect
 
     def set_color(self, color):
         self.color = color
@@ -36,19 +53,24 @@ class Label (Text):
         self.rect = pygame.Rect(pos, self.size)
 
     def _redraw(self):
-        text = self.font.render(self.label, True, self.color if self.ena else (100, 100, 100))
-
+        color = self.color if self.ena else (100, 100, 100)
         if self.size is None:
-            self.size = text.get_size()
+            self.size = self._render(self.label, color).get_size()
+        self.lbl = cache.get(('label', self.font, self.label, color, self.size), lambda: self._make_lbl(color))
+        self.dirty = True
 
-        self.lbl = pygame.Surface(self.size)
+    def _make_lbl(self, color):
+        text = self._render(self.label, color)
+        lbl = pygame.Surface(self.size)
 
-        self.lbl.fill((200, 200, 200))
-        dx = max(0, (self.lbl.get_width() - text.get_width()) // 2)
-        dy = max(0, (self.lbl.get_height() - text.get_height()) // 2)
-        self.lbl.blit(text, (dx, dy))
+        lbl.fill((200, 200, 200))
+        dx = max(0, (lbl.get_width() - text.get_width()) // 2)
+        dy = max(0, (lbl.get_height() - text.get_height()) // 2)
+        lbl.blit(text, (dx, dy))
+        return lbl
 
     def draw(self, surface):
+        self.dirty = False
         return surface.blit(self.lbl, self.rect)
 
     def press(self, pos):
@@ -81,36 +103,41 @@ class PushButton (Text):
         self.rect = pygame.Rect(pos, self.size)
 
     def _redraw(self):
-        color= [(0, 0, 0), (255, 255, 255), (100, 100, 100)][self.state]
-        text = self.font.render(self.label, True, color)
-
         if self.size is None:
-            self.size = text.get_size()
+            self.size = self._render(self.label, (0, 0, 0)).get_size()
             self.size = (self.size[0] + 4, self.size[1] + 4)
+        self.btn = cache.get(('button', self.font, self.label, self.state, self.size), self._make_btn)
+        self.dirty = True
+
+    def _make_btn(self):
+        color= [(0, 0, 0), (255, 255, 255), (100, 100, 100)][self.state]
+        text = self._render(self.label, color)
         size = self.size
 
-        self.btn = pygame.Surface(size)
-        self.btn.fill((200, 200, 200))
+        btn = pygame.Surface(size)
+        btn.fill((200, 200, 200))
 
-        dx = (self.btn.get_width() - text.get_width()) // 2
-        dy = (self.btn.get_height() - text.get_height()) // 2
+        dx = (btn.get_width() - text.get_width()) // 2
+        dy = (btn.get_height() - text.get_height()) // 2
 
         if self.state != self.StateDisabled:
-            ghost = self.font.render(self.label, True, (255 - color[0], 255 - color[1], 255 - color[2]))
-            self.btn.blit(ghost, (dx+1, dy+1))
-            self.btn.blit(text, (dx-1, dy-1))
+            ghost = self._render(self.label, (255 - color[0], 255 - color[1], 255 - color[2]))
+            btn.blit(ghost, (dx+1, dy+1))
+            btn.blit(text, (dx-1, dy-1))
         else:
-            self.btn.blit(text, (dx, dy))
+            btn.blit(text, (dx, dy))
 
         if self.state == self.StateEnabled:
-            pygame.draw.lines(self.btn, (50, 50, 50), False, [(size[0]-1, 1), (size[0]-1, size[1]-1), (1, size[1] - 1)], 3)
-            pygame.draw.lines(self.btn, (255, 255, 255), False, [(size[0]-1, 1), (1, 1), (1, size[1] - 1)], 3)
+            pygame.draw.lines(btn, (50, 50, 50), False, [(size[0]-1, 1), (size[0]-1, size[1]-1), (1, size[1] - 1)], 3)
+            pygame.draw.lines(btn, (255, 255, 255), False, [(size[0]-1, 1), (1, 1), (1, size[1] - 1)], 3)
 
         if self.state == self.StateArmed:
-            pygame.draw.lines(self.btn, (50, 50, 50), False, [(size[0]-1, 1), (1, 1), (1, size[1] - 1)], 3)
-            pygame.draw.lines(self.btn, (255, 255, 255), False, [(size[0]-1, 1), (size[0]-1, size[1]-1), (1, size[1] - 1)], 3)
+            pygame.draw.lines(btn, (50, 50, 50), False, [(size[0]-1, 1), (1, 1), (1, size[1] - 1)], 3)
+            pygame.draw.lines(btn, (255, 255, 255), False, [(size[0]-1, 1), (size[0]-1, size[1]-1), (1, size[1] - 1)], 3)
+        return btn
 
     def draw(self, surface):
+        self.dirty = False
         return surface.blit(self.btn, self.rect)
 
     def press(self, pos):
@@ -152,9 +179,16 @@ class Combobox (Label):
     def is_armed(self):
         return self.ena and self.armed_state == self.StateArmed
 
+    def is_tracking(self):
+        return self.is_armed()
+
     def _redraw_armed(self):
-        self.sel = pygame.Surface(self.armed_rect.size)
-        self.sel.fill((200, 200, 200))
+        self.sel = cache.get(('combobox', self.font, tuple(self.values), self.armed_index, self.armed_rect.size), self._make_sel)
+        self.dirty = True
+
+    def _make_sel(self):
+        sel = pygame.Surface(self.armed_rect.size)
+        sel.fill((200, 200, 200))
 
         h = self.font.get_linesize()
         w = self.armed_rect.width
@@ -162,15 +196,22 @@ class Combobox (Label):
         for i, v in enumerate(self.values):
             rect = pygame.Rect((0, i * h), (w, h))
             if i == self.armed_index:
-                self.sel.fill((100, 100, 100), rect)
-                text = self.font.render(f">{v}<", True, (255, 255, 255))
+                sel.fill((100, 100, 100), rect)
+                text = self._render(f">{v}<", (255, 255, 255))
             else:
-                text = self.font.render(v, True, (0, 0, 0))
+                text = self._render(v, (0, 0, 0))
             dx = max(0, (w - text.get_width()) // 2)
             dy = max(0, (h - text.get_height()) // 2)
-            self.sel.blit(text, (dx, dy + i * h))
+            sel.blit(text, (dx, dy + i * h))
+        return sel
+
+    def area(self):
+        if self.armed_state == self.StateDefault:
+            return self.rect
+        return self.armed_rect
 
     def draw(self, surface):
+        self.dirty = False
         if self.is_armed():
             return surface.blit(self.sel, self.armed_rect)
         surface.blit(self.lbl, self.rect)
@@ -179,6 +220,12 @@ class Combobox (Label):
             return self.armed_rect
         return self.rect
 
+    def set_index(self, index):
+        # from the outside, no on_update
+        self.index = index
+        if self.armed_state == self.StateDefault:
+            self.set_text(f">{self.values[index]}<")
+
     def armed_cancel(self):
         if self.armed_state == self.StateArmed:
             self.armed_state = self.StateArmedPost
@@ -205,8 +252,10 @@ class Combobox (Label):
     def track(self, pos):
         if self.is_armed():
             if self.armed_rect.collidepoint(pos):
-                self.armed_index = min(len(self.values) - 1, (pos[1] - self.armed_rect.top) // self.font.get_linesize())
-                self._redraw_armed()
+                index = min(len(self.values) - 1, (pos[1] - self.armed_rect.top) // self.font.get_linesize())
+                if index != self.armed_index:
+                    self.armed_index = index
+                    self._redraw_armed()
             else:
                 self.armed_cancel()
             return True
@@ -240,6 +289,10 @@ class Setting (object):
         self.index = max(self.index - 1, 0)
         self.update()
 
+    def set_index(self, index):
+        self.index = index
+        self.update(False)
+
     def setting_reset(self):
         self.index = self.idx
         self.update()
@@ -268,10 +321,19 @@ class Setting (object):
             u |= btn.track(pos)
         return u
 
+    def is_tracking(self):
+        return any(btn.is_tracking() for btn in self.btns)
+
     def enable(self, ena=True):
         for btn in self.btns:
             btn.enable(ena)
         self.lbl.enable(ena)
 
+    def is_dirty(self):
+        return self.lbl.is_dirty() or any(btn.is_dirty() for btn in self.btns)
+
+    def area(self):
+        return self.rect()
+
     def rect(self):
         return self.btns[0].rect.union(self.btns[1].rect)